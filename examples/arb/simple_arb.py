@@ -1,10 +1,11 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist example that should a custom waveform being programmed.
 
 The waveform generated here is a simple stairstep.
 """
 
 import sys
+import numpy as np
 
 sys.path.append('../..')
 
@@ -13,5 +14,5 @@ import fygen
 
 fy = fygen.FYGen(debug_level=1)
 
-fy.set_waveform(1, values=[n / 8192.0 for n in range(8192)])
+fy.set_waveform(1, values=np.arange(8192) / 8192.0)
 fy.set(channel=0, wave='arb1', freq_hz=1000, volts=3, enable=True)
@@ -1,8 +1,8 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Interpolates points to draw a star on an oscilloscope (when set to XY mode"""
 
-import math
 import sys
+import numpy as np
 
 sys.path.append('../..')
 
@@ -20,45 +20,24 @@ POINTS = [
     (0.3090, 0.9511),  # Pt 1
 ]
 
-def interpolate_segment(x1, y1, x2, y2, steps):
-  """Create interpolated points along a line."""
-  dx = x2 - x1
-  dy = y2 - y1
-  dx_step = dx / steps
-  dy_step = dy / steps
+def interpolate(data):
+  """Fills in interpolated points.
 
-  i = 0
-  while i < steps:
-    yield x1, y1
-    x1 += dx_step
-    y1 += dy_step
-    i += 1
+  Returns an array of (x, y) rows.
+  """
+  points = np.asarray(data, dtype=float)
 
-def interpolate(data):
-  """Fills in interpolated points."""
   # first determine relative lengths for point weights
-  lengths = []
-  for i in range(len(data) - 1):
-    j = i+1
-    x1, y1 = data[i]
-    x2, y2 = data[j]
-    dx = x2 - x1
-    dy = y2 - y1
-    lengths.append(math.sqrt(dx * dx + dy * dy))
-
-  sum_length = sum(lengths)
-  step = sum_length / DATA_LENGTH
-  print('lengths=%s' % lengths)
-
-  interpolated = []
-  for i in range(len(data) - 1):
-    j = i+1
-    x1, y1 = data[i]
-    x2, y2 = data[j]
-    interpolated.extend(
-        interpolate_segment(x1, y1, x2, y2, int(lengths[i] / step)))
-
-  return interpolated
+  lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+
+  step = lengths.sum() / DATA_LENGTH
+  print('lengths=%s' % lengths.tolist())
+
+  counts = (lengths / step).astype(int)
+  return np.concatenate([
+      np.linspace(points[i], points[i + 1], count, endpoint=False)
+      for i, count in enumerate(counts)
+  ])
 
 def pad(data):
   """Ensures the data length is correct."""
@@ -71,9 +50,7 @@ def pad(data):
     return data[:DATA_LENGTH]
 
   print('Extend data from %d points to %d' % (len(data), DATA_LENGTH))
-  while len(data) < DATA_LENGTH:
-    data.append(data[-1])
-  return data
+  return np.pad(data, ((0, DATA_LENGTH - len(data)), (0, 0)), mode='edge')
 
 def main():
   """Main entry point."""
@@ -81,8 +58,8 @@ def main():
 
   fy = fygen.FYGen(debug_level=1)
   fy.set((0, 1))
-  fy.set_waveform(1, values=[x for x, _ in data])
-  fy.set_waveform(2, values=[y for _, y in data])
+  fy.set_waveform(1, values=data[:, 0])
+  fy.set_waveform(2, values=data[:, 1])
   fy.set(0, freq_hz=10000, volts=6, wave='arb1', enable=True)
   fy.set(1, freq_hz=10000, volts=6, wave='arb2', enable=True)
 
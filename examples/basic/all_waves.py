@@ -1,12 +1,10 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 
 """Cycles though all avaliable waves."""
 
 import argparse
 import sys
 
-import six
-
 sys.path.append('../..')
 
 # pylint: disable=wrong-import-position
@@ -58,8 +56,8 @@ def show_waves(fy, c):
   for n, wave in enumerate(waves):
     fy.set(channel=c, wave=wave)
     if not ARGS.test_mode:
-      six.moves.input('%d/%d  Channel %d, %s (Press Enter To Continue)' %
-                      (n, len(waves), c, wavedef.get_description(wave)))
+      input('%d/%d  Channel %d, %s (Press Enter To Continue)' %
+            (n, len(waves), c, wavedef.get_description(wave)))
 
 def main():
   """Main function."""
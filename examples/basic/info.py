@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Get miscellaneous information"""
 
 import sys
@@ -13,7 +13,7 @@ fy = fygen.FYGen()
 def output(title, data):
   """Formats output."""
   print('--- %s ---' % title)
-  for k, v in sorted(data.iteritems()):
+  for k, v in sorted(data.items()):
     print('  %15s: %s' % (k, v))
 
 output('Device Info', {
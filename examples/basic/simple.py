@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist example that shows a sin wave being configured."""
 
 import sys
@@ -9,9 +9,12 @@ Example usage:
 """
 
 import argparse
+import array
+import heapq
 import math
+import re
 import sys
-import six
+import numpy as np
 
 sys.path.append('../..')
 
@@ -76,25 +79,26 @@ PARSER.add_argument(
 
 ARGS = PARSER.parse_args()
 
-def parse_gcode_line(line):
-  """Convert a line of gcode into a dict."""
-
-  if ';' in line:
-    line = line.split(';')[0]  # remove comment
+# A gcode word is a letter followed by a number.  e.g. X-12.5
+GCODE_WORD_RE = re.compile(
+    br'([A-Z])([-+]?(?:\d+\.?\d*|\.\d+)(?:E[-+]?\d+)?)')
 
-  d = {}
-  for token in line.split():
-    if len(token) < 2:
-      continue
-    token = token.upper()
-    d[token[0]] = float(token[1:])
+def parse_gcode_line(line):
+  """Convert an uppercased line of gcode (bytes) into a dict.
 
-  return d
+  Keys are single bytes, e.g. b'X'.
+  """
+  line = line.split(b';', 1)[0]  # remove comment
+  return {
+      m.group(1): float(m.group(2))
+      for m in GCODE_WORD_RE.finditer(line)
+  }
 
 def read_gcode(fin):
   """Reads a gcode file and extracts points.
 
-  Input is a file object.  Output is a list of (x, y, pen_down) coordinates
+  Input is a file object opened in binary mode.  Output is a tuple of
+  (x, y, pen_down) arrays
   """
 
   # current state.  A GCode line does not have to specify X Y and Z,
@@ -103,68 +107,62 @@ def read_gcode(fin):
   y = 0
   pen_down = True
   new_pen_down = False
-  data = []
+  xs = array.array('d')
+  ys = array.array('d')
+  pens = array.array('b')
 
   # no strict parsing here.  Just do what we can
   for line in fin:
+    line = line.upper()
+
+    # Cheap rejection of lines that can not be a G01 command before doing any
+    # real parsing.
+    if b'G1' not in line and b'G01' not in line:
+      continue
+
     d = parse_gcode_line(line)
 
-    if 'G' not in d:
+    if b'G' not in d:
       continue
 
     # Only support G01 commands.  Ignore everything else.
-    if int(d['G']) != 1:
+    if int(d[b'G']) != 1:
       continue
 
-    if 'Z' in d:
-      new_pen_down = int(d['Z']) == 0
+    if b'Z' in d:
+      new_pen_down = int(d[b'Z']) == 0
 
-    if 'X' in d:
-      x = d['X']
+    if b'X' in d:
+      x = d[b'X']
 
-    if 'Y' in d:
-      y = d['Y']
+    if b'Y' in d:
+      y = d[b'Y']
 
     # The "if" here to avoid multiple pen up movements in a sequence.  It also
     # keeps pen up movements at the start and end of the file off the list
     if new_pen_down or pen_down:
-      data.append((x, y, new_pen_down))
+      xs.append(x)
+      ys.append(y)
+      pens.append(new_pen_down)
 
     pen_down = new_pen_down
 
   # remove pen_up events at the end
-  while not data[-1][2]:
-    del data[-1]
-
-  return data
-
-def bound_coordinates(data):
-  """Determines bondaries from a list of (x,y,pen_down) coordinates."""
-
-  xmin = None
-  ymin = None
-  xmax = None
-  ymax = None
-
-  for p in data:
-    x, y, _ = p
+  end = len(pens)
+  while not pens[end - 1]:
+    end -= 1
 
-    if xmin is None or x < xmin:
-      xmin = x
+  return (
+      np.array(xs[:end], dtype=float),
+      np.array(ys[:end], dtype=float),
+      np.array(pens[:end], dtype=bool))
 
-    if xmax is None or x > xmax:
-      xmax = x
+def bound_coordinates(x, y):
+  """Determines bondaries from x and y coordinate arrays."""
+  return x.min(), y.min(), x.max(), y.max()
 
-    if ymin is None or y < ymin:
-      ymin = y
 
-    if ymax is None or y > ymax:
-      ymax = y
-
-  return xmin, ymin, xmax, ymax
-
-
-def interpolate(data):
+def interpolate(x, y, pen):
   """Adds extra points between longer gaps.
 
   Without interpolation, longer lines will not get their fair share of presense
@@ -179,126 +177,191 @@ def interpolate(data):
   provided.
   """
 
-  length = calc_length(data)
+  length = calc_length(x, y, pen)
   segment_size = length / ARGS.data_length
 
   print('length=%s  segment_size=%s' % (length, segment_size))
 
-  datai = (p for p in data)
-  x1, y1, pen_down = six.next(datai)
-  new_data = [(x1, y1, pen_down)]
+  return interpolate_segments(x, y, pen, segment_size)
 
-  for p in datai:
-    x2, y2, pen_down = p
-    if pen_down:
-      new_data.extend(interpolate_segment(x1, y1, x2, y2, segment_size))
-    else:
-      # always add this point
-      new_data.append((x2, y2, False))
-    x1 = x2
-    y1 = y2
+# pylint: disable=too-many-locals
+def interpolate_segments(x, y, pen, segment_size):
+  """Generates interpolated points for every segment at once.
 
-  return new_data
+  A pen down segment from point i to point i + 1 gets one point every
+  segment_size units along its length, followed by point i + 1 itself.  A pen
+  up segment only gets point i + 1.  Point 0 is always kept.
 
-def interpolate_segment(x1, y1, x2, y2, segment_size):
-  """If the length of the segment is less than segment_size, returns [(x2, y2)].
+  Returns new (x, y, pen) arrays.
+  """
+  dx = np.diff(x)
+  dy = np.diff(y)
+  lengths = np.hypot(dx, dy)
+
+  steps = np.zeros(len(lengths), dtype=np.intp)
+  drawn = pen[1:] & (lengths > 0)
+  steps[drawn] = np.floor(lengths[drawn] / segment_size)
+
+  # Every segment also emits its end point.
+  counts = steps + 1
+  total = int(counts.sum()) + 1
+
+  # seg is the source segment of each new point and k is the 1-based position
+  # of that point within its segment.
+  seg = np.repeat(np.arange(len(counts)), counts)
+  k = np.arange(1, total) - np.repeat(np.cumsum(counts) - counts, counts)
+  is_end = k == counts[seg]
+
+  scale = np.zeros(len(lengths))
+  np.divide(segment_size, lengths, out=scale, where=drawn)
+  x_step = dx * scale
+  y_step = dy * scale
+
+  new_x = np.empty(total)
+  new_y = np.empty(total)
+  new_pen = np.empty(total, dtype=bool)
+  new_x[0] = x[0]
+  new_y[0] = y[0]
+  new_pen[0] = pen[0]
+  new_x[1:] = np.where(is_end, x[seg + 1], x[seg] + k * x_step[seg])
+  new_y[1:] = np.where(is_end, y[seg + 1], y[seg] + k * y_step[seg])
+  new_pen[1:] = pen[seg + 1]
+
+  return new_x, new_y, new_pen
+
+def calc_length(x, y, pen):
+  """Determines the line length of the entire drawing."""
+  return float(np.hypot(np.diff(x), np.diff(y))[pen[1:]].sum())
 
-  Otherwise, generates interpolated points from x1, y1 to x2, y2."""
-  dx = x2 - x1
-  dy = y2 - y1
-  length = math.sqrt(dx * dx + dy * dy)
+def reduce(x, y, pen, target_length):
+  """Removes the shortest segments until at most target_length points remain.
 
-  if length > 0:
-    x_step = dx / length * segment_size
-    y_step = dy / length * segment_size
+  There are two kinds of removal candidates:
 
-  data = []
-  while length >= segment_size:
-    x1 += x_step
-    y1 += y_step
-    data.append((x1, y1, True))
-    length -= segment_size
+    - A point that is bookended by pen down points.  eg, if we have the points
+      P1F, P2T, P3T, P4T, P5T, P6F  where T/F are pen_down, P3 and P4 are
+      candidates.  Its cost is the shorter of its two segments and only the
+      point itself is removed.
+    - A pattern of the form P1F, P2T, P3T, P4F.  Its cost is the P2->P3 length
+      and P2, P3 and P4 are all removed.  All three need to be removed or we
+      will end up with back to back pen up events.
 
-  data.append((x2, y2, True))
-  return data
+  Candidates are kept in a heap ordered by cost.  Removing points changes the
+  neighbors (and thus the cost) of the points around them, so those points
+  are re-evaluated and pushed again with a new version number.  Heap entries
+  with an old version are skipped when they are popped.
 
-def calc_length(data):
-  """Determines the line length of the entire drawing."""
-  length = 0.0
-
-  datai = (p for p in data)
-  x1, y1, _ = six.next(datai)
-
-  for p in datai:
-    x2, y2, pen_down = p
-    if pen_down:
-      dx = x2 - x1
-      dy = y2 - y1
-      length += math.sqrt(dx * dx + dy * dy)
-    x1 = x2
-    y1 = y2
-
-  return length
-
-def reduce(data, points_to_remove):
-  """Remove points_to_remove segments.
-
-  The segments removed were the shortest found in the original data.  removal
-  feedback is not accounted for so removing a large number of points can lead
-  to non-optimal selection."""
-  print('Reducing %d points down to %d points' %
-        (len(data), len(data) - points_to_remove))
-  # create a list to qualifying indexes of the form (length, index)
-  lengths = []
-
-  # iteration 1, calc points that are bookended by pen down points
-  # eg, if we have the points P1F, P2T, P3T, P4T, P5T, P6F  where T/F are
-  # pen_down, P3 and P4 are added for consideration.  P1, P2, P5 and P6 are not
-  # because they are edge boundaries.
-
-  for idx in range(1, len(data) - 1):
-    if not data[idx - 1][2] or not data[idx][2] or not data[idx + 1][2]:
-      # pen is up before, on or after this point, so don't consider it
-      continue
-    x1, y1, _ = data[idx - 1]
-    x2, y2, _ = data[idx]
-    x3, y3, _ = data[idx + 1]
-
-    length = min(line_length(x1, y1, x2, y2), line_length(x2, y2, x3, y3))
-    lengths.append((length, idx))
-
-  # iteration 2, find patterns of the form
-  # P1F, P2T, P3T, P4F, then add the P2->P3 length and P2, P3 for
-  # consideration
-  pen_down_sequence_len = 0
-  # pylint: disable=consider-using-enumerate
-  for idx in range(len(data)):
-    if data[idx][2]:
-      pen_down_sequence_len += 1  # tracking the number of pen_down events
-    else:
-      if pen_down_sequence_len == 2:  # only trigger if there were two
-        x1, y1, _ = data[idx - 2]  # 1 and two back are the pen_down events
-        x2, y2, _ = data[idx - 1]
-        # Add this pen up event, along with the previous pen down events
-        # All three need to be removed or we will end up with back to back
-        # pen up events.  Also note the reverse order which is needed
-        # for clean removal.
-        lengths.append((line_length(x1, y1, x2, y2), idx, idx - 1, idx - 2))
-
-      pen_down_sequence_len = 0
-  # pylint: enable=consider-using-enumerate
-
-  # sort by length and cull
-  lengths.sort()
-  lengths = lengths[:points_to_remove]
-  # now reverse sort by index so that we can remove points without invalidating
-  # indexes
-  lengths.sort(key=lambda p: -p[1])
-
-  # start deleting points
-  for sequence in lengths:
-    for idx in sequence[1:]:
-      del data[idx]
+  Returns the reduced (x, y, pen) arrays.
+  """
+  count = len(x)
+  print('Reducing %d points down to %d points' % (count, target_length))
+
+  xs = x.tolist()
+  ys = y.tolist()
+  pens = pen.tolist()
+  # doubly linked list over the surviving points, -1 marks either end
+  prev = list(range(-1, count - 1))
+  next_ = list(range(1, count + 1))
+  next_[-1] = -1
+  keep = np.ones(count, dtype=bool)
+  version = [0] * count
+
+  def distance(idx1, idx2):
+    """Length of the segment between two points."""
+    return line_length(xs[idx1], ys[idx1], xs[idx2], ys[idx2])
+
+  def candidate(idx):
+    """Returns (cost, idx, version, points to remove) or None."""
+    p = prev[idx]
+    if p < 0 or not pens[p]:
+      return None
+
+    n = next_[idx]
+    if pens[idx]:
+      if n < 0 or not pens[n]:
+        return None
+      cost = min(distance(p, idx), distance(idx, n))
+      return (cost, idx, version[idx], (idx,))
+
+    # idx is a pen up event, look for exactly two pen down events before it
+    pp = prev[p]
+    if pp < 0 or not pens[pp]:
+      return None
+    ppp = prev[pp]
+    if ppp >= 0 and pens[ppp]:
+      return None
+    return (distance(pp, p), idx, version[idx], (idx, p, pp))
+
+  heap = initial_candidates(x, y, pen)
+  heapq.heapify(heap)
+
+  while count > target_length and heap:
+    _, idx, ver, removed = heapq.heappop(heap)
+    if not keep[idx] or ver != version[idx]:
+      continue  # stale entry
+
+    # removed is a run of consecutive points, last to first
+    for r in removed:
+      keep[r] = False
+      if prev[r] >= 0:
+        next_[prev[r]] = next_[r]
+      if next_[r] >= 0:
+        prev[next_[r]] = prev[r]
+    count -= len(removed)
+
+    # A point's cost depends on one point after it and up to three points
+    # before it, so re-evaluate the left neighbor and three points to the
+    # right.
+    affected = [prev[removed[-1]]]
+    n = next_[removed[0]]
+    while n >= 0 and len(affected) < 4:
+      affected.append(n)
+      n = next_[n]
+
+    for a in affected:
+      if a >= 0:
+        version[a] += 1
+        c = candidate(a)
+        if c:
+          heapq.heappush(heap, c)
+
+  return x[keep], y[keep], pen[keep]
+# pylint: enable=too-many-locals
+
+def initial_candidates(x, y, pen):
+  """Builds the starting reduce() heap entries with array operations.
+
+  Each segment length is calculated once and shared by the two points that
+  use it.
+  """
+  # seg[i] is the length from point i to point i + 1.  This matches
+  # line_length() bit for bit so costs compare equal to later updates.
+  dx = np.diff(x)
+  dy = np.diff(y)
+  seg = np.sqrt(dx * dx + dy * dy)
+
+  # points bookended by pen down points cost their shorter segment
+  bookended = pen[:-2] & pen[1:-1] & pen[2:]
+  costs = np.minimum(seg[:-1], seg[1:])[bookended]
+  indexes = np.nonzero(bookended)[0] + 1
+  candidates = [
+      (cost, idx, 0, (idx,))
+      for cost, idx in zip(costs.tolist(), indexes.tolist())
+  ]
+
+  # pen up events preceded by exactly two pen down events cost the segment
+  # between those two points
+  run_start = np.ones(len(pen), dtype=bool)
+  run_start[3:] = ~pen[:-3]
+  pairs = np.zeros(len(pen), dtype=bool)
+  pairs[2:] = ~pen[2:] & pen[1:-1] & pen[:-2] & run_start[2:]
+  indexes = np.nonzero(pairs)[0]
+  candidates.extend(
+      (cost, idx, 0, (idx, idx - 1, idx - 2))
+      for cost, idx in zip(seg[indexes - 2].tolist(), indexes.tolist())
+  )
+
+  return candidates
 
 def line_length(x1, y1, x2, y2):
   """Calculates the length of a line."""
@@ -308,46 +371,31 @@ def line_length(x1, y1, x2, y2):
 
 def main():
   """Program entry point."""
-  with open(ARGS.filename) as fin:
-    data = read_gcode(fin)
+  with open(ARGS.filename, 'rb') as fin:
+    x, y, pen = read_gcode(fin)
 
   # add points along longer lines
-  data = interpolate(data)
+  x, y, pen = interpolate(x, y, pen)
 
   # reduce size until its correct.
-  # This is a non-trivial problem.  To keep detail, we remove the
-  # points that are closest to one another.  But removing a point affects the
-  # distance calculation on the point before and after it.  Thus we have
-  # options:
-  #
-  # Remove one point at a time.  This will be slow O(n*n) but is simple
-  #
-  # Create a data structure that can quickly recalculate and reprioritize
-  # the lengths of points that neighbor a removed one.  This is complex and
-  # likely to be buggy.
-  #
-  # Remove n points at a time.  One of these n points might be a bad choice
-  # but the closer the point is to the shortest, the less likely it would have
-  # survived the final culling anyway.
-  #
-  # We go for the last option, removing 1/10 of the needed points each iteration
-  while len(data) > ARGS.data_length:
-    points_to_remove = int((len(data) - ARGS.data_length) / 10)
-    if points_to_remove < 1:
-      points_to_remove = 1
-    reduce(data, points_to_remove)
+  # To keep detail, we remove the points that are closest to one another.
+  # Removing a point affects the distance calculation on the point before and
+  # after it, so reduce() tracks those changes as it goes.
+  if len(x) > ARGS.data_length:
+    x, y, pen = reduce(x, y, pen, ARGS.data_length)
 
   # It's also poosible that data is a bit too short, usually just a single point
   # The "solution" is to duplicate the final point
-  if len(data) < ARGS.data_length:
-    print('Extending data from %d -> %d points' % (len(data), ARGS.data_length))
-  while len(data) < ARGS.data_length:
-    data.append(data[-1])
+  if len(x) < ARGS.data_length:
+    print('Extending data from %d -> %d points' % (len(x), ARGS.data_length))
+    missing = ARGS.data_length - len(x)
+    x = np.pad(x, (0, missing), mode='edge')
+    y = np.pad(y, (0, missing), mode='edge')
 
-  xmin, ymin, xmax, ymax = bound_coordinates(data)
+  xmin, ymin, xmax, ymax = bound_coordinates(x, y)
 
   print('len(data)=%u, xmin=%s  xmax=%s  ymin=%s  ymax=%s' %
-        (len(data), xmin, xmax, ymin, ymax))
+        (len(x), xmin, xmax, ymin, ymax))
 
   if ARGS.dry_run:
     fy = fygen.FYGen(port=sys.stdout, debug_level=ARGS.debug_level)
@@ -355,10 +403,8 @@ def main():
     fy = fygen.FYGen(debug_level=ARGS.debug_level)
 
   fy.set((0, 1), volts=ARGS.volts, freq_hz=ARGS.freq_hz)
-  fy.set_waveform(
-      ARGS.xarb, values=[x for x, _, _ in data], min_value=xmin, max_value=xmax)
-  fy.set_waveform(
-      ARGS.yarb, values=[y for _, y, _ in data], min_value=ymin, max_value=ymax)
+  fy.set_waveform(ARGS.xarb, values=x, min_value=xmin, max_value=xmax)
+  fy.set_waveform(ARGS.yarb, values=y, min_value=ymin, max_value=ymax)
   fy.set(
       0,
       wave='arb%d' % ARGS.xarb,
@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist example that shows a sin wave being configured."""
 
 import sys
@@ -12,6 +12,6 @@ import fygen
 fy = fygen.FYGen()
 fy.get_measurement()  # get into the correct mode
 time.sleep(1.5)
-for k, v in fy.get_measurement().iteritems():
+for k, v in fy.get_measurement().items():
   print('%20s: %s' % (k, v))
 
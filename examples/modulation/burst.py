@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist burst example.
 
 This one sets up a 10Khz sin wave that is triggered by a 1Khz square wave.
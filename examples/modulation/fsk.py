@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist FSK modulation example.
 
 Setup a triangular wave that alternates between 1Khz and 2Khz each second
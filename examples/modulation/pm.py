@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist PM modulation example.
 
 Setup a 1kz sin wave that is modulated by a 500hz square wave
@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist PSK modulation example.
 
 Setup a 1kz CMOS wave that changes inverts at 100hz
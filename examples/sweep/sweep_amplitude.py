@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist sweep example that sweeps between 3.3 and 5V."""
 
 import sys
@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist sweep example that changes the duty cycle between 0.1 and 0.9."""
 
 import sys
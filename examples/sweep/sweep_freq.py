@@ -1,4 +1,4 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Minimalist sweep example that sweeps between 1khz and 10khz."""
 
 import sys
@@ -5,10 +5,12 @@ See help.py or use the command fygen.help() for more documentation.
 # pylint: disable=too-many-lines
 # pylint: disable=too-many-public-methods
 
+import array
+import binascii
+import contextlib
+import functools
 import sys
 import time
-import functools
-import six
 import serial
 import fygen_help
 import wavedef
@@ -70,6 +72,49 @@ SYNC_MODES = {
 # Maximum read size
 MAX_READ_SIZE = 256
 
+# Serial driver buffer size, where it can be set
+SERIAL_BUFFER_SIZE = 4096
+
+# get() query prefixes, indexed by channel
+_READ_PREFIXES = ('RM', 'RF')
+
+# set() command prefixes, indexed by channel
+_WRITE_PREFIXES = ('WM', 'WF')
+
+# set_measurement() commands for each gate time and coupling
+_GATE_TIME_COMMANDS = {
+    GATE_TIME_1S: 'WCG0',
+    GATE_TIME_10S: 'WCG1',
+    GATE_TIME_100S: 'WCG2',
+}
+_COUPLING_COMMANDS = {
+    COUPLING_AC: 'WCC0',
+    COUPLING_DC: 'WCC1',
+}
+
+# get_measurement() parameters, as (command, divisor).  A divisor of None
+# means the response is an integer.  freq_hz also depends on the gate time.
+_MEASUREMENT_COMMANDS = {
+    'freq_hz': ('RCF', None),
+    'counter': ('RCC', None),
+    'period_sec': ('RCT', 1000000000.0),
+    'positive_width_sec': ('RC+', 1000000000.0),
+    'negative_width_sec': ('RC-', 1000000000.0),
+    'duty_cycle': ('RCD', 1000.0),
+}
+
+# get_uplink() parameters, as (command, convert(response), _settings key)
+_UPLINK_COMMANDS = {
+    'enable': ('RUL', lambda r: bool(int(r)), 'uplink_enable'),
+    'is_master': ('RMS', lambda r: not bool(int(r)), 'is_master'),
+}
+
+# Commands that return data, which can not be queued by batched()
+_QUERY_PREFIXES = ('R', 'UID', 'UMO', 'DDS_WAVE')
+
+# Supported devices by their 4 character model prefix (see detect_device)
+_DEVICE_PREFIXES = {d[:4]: d for d in wavedef.SUPPORTED_DEVICES}
+
 # Initialization state
 SET_INIT_STATE = {
     'channel': (0, 1),
@@ -85,6 +130,9 @@ SET_INIT_STATE = {
 class Error(Exception):
   """Base error class."""
 
+class BatchedReadError(Error):
+  """Tried to send a command that returns data inside of batched()"""
+
 class ChannelActiveError(Error):
   """Tried to define a waveform that is currently being generated"""
 
@@ -157,6 +205,9 @@ class PossibleFirmwareBugError(Error):
 class RawValueConflictError(Error):
   """Tried to pass both values and raw_values."""
 
+class RawValueRangeError(Error):
+  """Passed a raw value outside of the 14-bit range."""
+
 class UnknownParameterError(Error):
   """Asked for an unknown parameter."""
 
@@ -179,6 +230,7 @@ def help(section=0, device='fy2300', fout=sys.stdout):
 def get_version():
   return VERSION
 
+@functools.lru_cache(maxsize=None)
 def detect_device(model):
   """
   Tries to determine the best-matching device for the given model
@@ -187,9 +239,9 @@ def detect_device(model):
 
   # Try matching based on prefix, this is helpful to map e.g.
   # FY2350H to FY2300
-  for device in wavedef.SUPPORTED_DEVICES:
-    if device[:4] == model[:4]:
-      return device
+  device = _DEVICE_PREFIXES.get(model[:4])
+  if device:
+    return device
 
   raise wavedef.UnsupportedDeviceError(
       "Unable to autodetect device '%s'. "
@@ -208,6 +260,24 @@ class FYGen(object):
   One can also simply point this to sys.stdout to see low-level details without
   talking with a real device.
   """
+  # Instances returned by shared(), keyed by port or serial_path
+  _shared_instances = {}
+
+  @classmethod
+  def shared(cls, serial_path='/dev/ttyUSB0', port=None, **kwargs):
+    """Returns a process-wide FYGen for the given port or serial_path.
+
+    The first call creates the object using the same arguments as FYGen().
+    Later calls for the same port or serial_path return that object and ignore
+    any other arguments.  A closed object is replaced with a new one.
+    """
+    key = port if port else serial_path
+    fy = cls._shared_instances.get(key)
+    if fy is None or fy.port is None:
+      fy = cls(serial_path, port=port, **kwargs)
+      cls._shared_instances[key] = fy
+    return fy
+
   def __init__(
       self,
       serial_path='/dev/ttyUSB0',
@@ -221,6 +291,9 @@ class FYGen(object):
       max_volts=20.0,
       min_volts=-20.0,
       _port_is_serial=False,
+      *,
+      low_latency=True,
+      batch=True,
   ):
     """Initializes connection to device.
 
@@ -247,6 +320,13 @@ class FYGen(object):
       timeout: How long to block reads and writes
       max_volts: Maximum volts/offset to allow
       min_volts: Minimum voltage offset to allow
+      low_latency: If True, ask the USB serial driver to pass along received
+        data right away instead of batching it (Linux only).  This shortens
+        every command round trip.  It is silently skipped if the OS or driver
+        does not support it.
+      batch: If True, functions that send several commands write them all at
+        once and then read the responses.  Set to False to send them one at a
+        time, which can help when debugging.
     """
     if port:
       self.port = port
@@ -269,12 +349,29 @@ class FYGen(object):
           timeout=timeout)
 
       self.is_serial = True
+      if low_latency:
+        _enable_low_latency(self.port)
+      _set_buffer_size(self.port)
       self.port.reset_output_buffer()
       self.port.reset_input_buffer()
 
+    # True when the last response was read up to its newline, which means no
+    # stale bytes are waiting and the buffer resets in send() can be skipped.
+    self._port_idle = not port
+
     self.init_state = init_state
     self.read_before_write = read_before_write and self.is_serial
     self.debug_level = debug_level
+    self.batch = batch
+    # Commands queued by batched(), or None when not batching
+    self._pending = None
+    # Synchronization modes that are known, see get_synchronization()
+    self._sync_state = {}
+    # Known buzzer and uplink settings, see set_buzzer() and set_uplink()
+    self._settings = {}
+    # Device id and model, read once by get_id() and get_model()
+    self._id = None
+    self._model = None
     self.init_called_for_channel = set()
     self.device_name = device_name
     self.default_channel = default_channel
@@ -302,49 +399,169 @@ class FYGen(object):
     self.port.close()
     self.port = None
 
-  def send(self, command, retry_count=5):
-    """Sends command, then waits for a response.  Returns the response."""
+  def send(self, command, retry_count=5, expect_reply=True):
+    """Sends command, then waits for a response.  Returns the response.
+
+    If expect_reply is False, the response is still waited for but is not
+    decoded, and '' is returned.  Inside of batched(), the command is queued
+    instead and '' is returned.
+    """
     if len(command) < 3:
       raise CommandTooShortError('Command too short: %s' % command)
 
+    if self._pending is not None:
+      return self._queue([command])[0]
+
     if self.debug_level == 2:
-      six.moves.input('%s (Press Enter to Send)' % command)
+      input('%s (Press Enter to Send)' % command)
 
-    data = command + '\n'
     if self.is_serial:
-      data = data.encode()
-      self.port.reset_output_buffer()
-      self.port.reset_input_buffer()
+      data = command.encode() + b'\n'
+      self._reset_buffers()
+    else:
+      data = command + '\n'
 
     self.port.write(data)
     self.port.flush()
 
-    response = self._recv(command)
+    response = self._recv(command, expect_reply)
 
     if self.is_serial and not response and retry_count > 0:
       # sometime the siggen answers queries with nothing.  Wait a bit and try
       # again
       time.sleep(0.1)
-      return self.send(command, retry_count - 1)
+      return self.send(command, retry_count - 1, expect_reply)
+
+    return response.strip() if expect_reply else ''
+
+  def _send_many(self, commands, expect_reply=True):
+    """Sends several commands with a single write, then reads each response.
+
+    The device answers commands in order, so all of the commands are written
+    (and flushed) together and the responses are read back afterwards.  This
+    avoids a USB round trip per command.
+
+    Returns a list of responses, one for each command.  As with send(), these
+    are all '' if expect_reply is False.
+    """
+    if self._pending is not None:
+      return self._queue(commands)
+
+    if len(commands) == 1 or not self.batch:
+      return [
+          self.send(command, expect_reply=expect_reply)
+          for command in commands]
+
+    for command in commands:
+      if len(command) < 3:
+        raise CommandTooShortError('Command too short: %s' % command)
+
+    if self.debug_level == 2:
+      for command in commands:
+        input('%s (Press Enter to Send)' % command)
+
+    data = ''.join(command + '\n' for command in commands)
+    if self.is_serial:
+      data = data.encode()
+      self._reset_buffers()
+
+    self.port.write(data)
+    self.port.flush()
+
+    responses = []
+    for index, command in enumerate(commands):
+      response = self._recv(command, expect_reply)
+      if self.is_serial and not response:
+        # sometime the siggen answers queries with nothing.  A late reply
+        # could be paired with the wrong command, so wait a bit and send the
+        # rest of the batch again in order.  send() discards whatever is left
+        # in the buffers first.
+        time.sleep(0.1)
+        self._port_idle = False
+        responses.extend(
+            self.send(c, retry_count=4, expect_reply=expect_reply)
+            for c in commands[index:])
+        # A late reply from the batch might still arrive, so the next write
+        # resets the buffers no matter how the last response ended.
+        self._port_idle = False
+        break
+      responses.append(response.strip() if expect_reply else '')
+
+    return responses
+
+  @contextlib.contextmanager
+  def batched(self):
+    """Queues commands and sends them with a single write at the end.
+
+    Example:
+      with fy.batched():
+        fy.set(0, wave='sin', freq_hz=1000, enable=True)
+        fy.set(1, wave='square', freq_hz=1000, enable=True)
+        fy.set_uplink(enable=False)
+
+    Commands that return data (such as get()) raise BatchedReadError inside
+    of the block.  read_before_write is not used for queued set() calls.  If
+    the block raises, the queued commands are discarded.  Nested blocks are
+    sent when the outermost block exits.
+    """
+    if self._pending is not None:
+      yield self
+      return
+
+    self._pending = []
+    init_called = set(self.init_called_for_channel)
+    commands = None
+    try:
+      yield self
+      commands = self._pending
+    finally:
+      self._pending = None
+      if commands is None:
+        # The init state was only queued, so it still needs to be sent.
+        self.init_called_for_channel.intersection_update(init_called)
+
+    if commands:
+      self._send_many(commands, expect_reply=False)
+
+  def _queue(self, commands):
+    """Adds commands to the batched() queue.  Returns a '' per command."""
+    for command in commands:
+      if command.startswith(_QUERY_PREFIXES):
+        raise BatchedReadError(
+            'Can not read data inside of batched(): %s' % command)
+      if len(command) < 3:
+        raise CommandTooShortError('Command too short: %s' % command)
+    self._pending.extend(commands)
+    return [''] * len(commands)
+
+  def _update_state(self, state, key, value):
+    """Records a setting that was just sent in a state dictionary."""
+    if self._pending is None:
+      state[key] = value
+    else:
+      # The queued command might be discarded.
+      state.pop(key, None)
 
-    return response.strip()
+  def _reset_buffers(self):
+    """Discards stale serial data, unless the last response was complete."""
+    if not self._port_idle:
+      self.port.reset_output_buffer()
+      self.port.reset_input_buffer()
+    self._port_idle = False
 
-  # Note: unused-argument is disabled because we are capturing locals()
-  # into a local variable and accessing these variables using that method
-  #
   # pylint counts arguments as local variables:
   #pylint: disable=too-many-locals
   def set(
       self,
       channel=None,
-      enable=None,         #pylint: disable=unused-argument
-      wave=None,           #pylint: disable=unused-argument
-      freq_hz=None,        #pylint: disable=unused-argument
-      freq_uhz=None,       #pylint: disable=unused-argument
-      volts=None,          #pylint: disable=unused-argument
-      offset_volts=None,   #pylint: disable=unused-argument
-      phase_degrees=None,  #pylint: disable=unused-argument
-      duty_cycle=None,     #pylint: disable=unused-argument
+      enable=None,
+      wave=None,
+      freq_hz=None,
+      freq_uhz=None,
+      volts=None,
+      offset_volts=None,
+      phase_degrees=None,
+      duty_cycle=None,
       retry_count=3):
     """Change device settings.
 
@@ -372,8 +589,17 @@ class FYGen(object):
         be verified and resent if verification fails.
     """
 
-    # Convert local arguments into a dictionary
-    args_dict = dict(locals())
+    # Parameters in the order they are sent (before enable is moved)
+    params = [
+        ('enable', enable),
+        ('wave', wave),
+        ('freq_hz', freq_hz),
+        ('freq_uhz', freq_uhz),
+        ('volts', volts),
+        ('offset_volts', offset_volts),
+        ('phase_degrees', phase_degrees),
+        ('duty_cycle', duty_cycle),
+    ]
 
     if freq_hz is not None and freq_uhz is not None:
       raise InvalidFrequencyError(
@@ -386,24 +612,24 @@ class FYGen(object):
       channel = (channel,)
 
     for c in channel:
-      chan_dict = dict(args_dict)
+      chan_params = list(params)
       for _ in range(retry_count):
-        if not self._set_for_channel(c, chan_dict):
+        if not self._set_for_channel(c, chan_params):
           break  # nothing was sent
-        if not self.read_before_write:
+        if not self.read_before_write or self._pending is not None:
           break  # Since there is no get, we don't know if a retry is needed.
 #pylint: enable=too-many-locals
 
 
-  def _set_for_channel(self, channel, args_dict):
+  def _set_for_channel(self, channel, params):
     """Implements set as above, but for a single channel.
 
     Args:
       channel: Channel to set (0 or 1)
-      args_dict: Key-pairs.  e.g. {'volts': 5.5}.  NOTE: this function does
-        modify args_dict by *removing* arguments that are already confirmed
-        as set from the dictionary.  This is done to avoid redundant reads
-        on retries.
+      params: A list of (name, value) pairs.  e.g. [('volts', 5.5)].  NOTE:
+        this function does modify params by *removing* arguments that are
+        None or already confirmed as set.  This is done to avoid redundant
+        reads on retries.
     """
     if channel not in (0, 1):
       raise InvalidChannelError('Invalid channel: %s' % channel)
@@ -413,70 +639,43 @@ class FYGen(object):
       # This is the first call to set for this channel.  Fill in non-specified
       # arguments from SET_INIT_STATE
       self.init_called_for_channel.add(channel)
-      for k, v in six.iteritems(SET_INIT_STATE):
-        if args_dict[k] is None:
-          args_dict[k] = v
-
-    # convert args from a dict to a list so we can order enable=True/False
-    # properly and remove null values
-    args = list((k, v) for k, v in six.iteritems(args_dict) if v is not None)
-
-    enable = args_dict.get('enable', None)
+      params[:] = [
+          (k, SET_INIT_STATE.get(k) if v is None else v) for k, v in params]
+
+    params[:] = [(k, v) for k, v in params if v is not None]
+
+    # Order the args so enable=False goes at the beginning and enable=True at
+    # the end of the list.  This minimizes transient states being generated
+    # to connected equipment.
+    head, mid, tail = [], [], []
+    for k, v in params:
+      if k == 'enable':
+        (tail if v else head).append((k, v))
+      else:
+        mid.append((k, v))
+    args = head + mid + tail
 
-    # enable=False should to be moved to the beginning of the args list to
-    # minimize transient states being generated to connected equipment.
-    if enable is not None and not enable:
-      del args[args.index(('enable', enable))]
-      args.insert(0, ('enable', enable))
+    args = [(k, v) for k, v in args if k in _COMMAND_BUILDERS]
 
-    # enable=true needs to be moved to the end of the list, again to minimize
-    # transient states being generated.
-    if enable is not None and enable:
-      del args[args.index(('enable', enable))]
-      args.append(('enable', enable))
+    current = {}
+    if self.read_before_write and self._pending is None and args:
+      # Read every parameter back at once to see which need to be set.
+      current = self._get_params(channel, [k for k, _ in args])
 
-    def should_set(chan, parm_name, expected_value):
-      """Returns true if the write to the siggen should proceed."""
-      if not self.read_before_write:
-        return True
-
-      if self.get(chan, parm_name) == expected_value:
+    command_list = []
+    for name, value in args:
+      if name in current and current[name] == value:
         # No need to set as the value is already where it needs to be.
         # Also, delete the argument from future retries
-        del args_dict[parm_name]
-        return False
-
-      return True
-
-    # Map various parameter names to function that check arguments
-    # and generate the correct low-level string.
-    make_command = {
-        'duty_cycle': functools.partial(_make_duty_cycle_command, channel),
-        'enable': functools.partial(_make_enable_command, channel),
-        'freq_hz': functools.partial(_make_freq_hz_command, channel, include_decimal=self.frequency_includes_decimal),
-        'freq_uhz': functools.partial(_make_freq_uhz_command, channel, include_decimal=self.frequency_includes_decimal),
-        'offset_volts': functools.partial(
-            _make_offset_volts_command,
-            channel,
-            self.min_volts,
-            self.max_volts),
-        'phase_degrees': functools.partial(_make_phase_command, channel),
-        'volts': functools.partial(
-            _make_volts_command, channel, self.max_volts),
-        'wave': functools.partial(
-            _make_wave_command, channel, self.device_name),
-    }
-
-    command_list = []
-    for name, value in (a for a in args if a[0] in make_command):
-      if not should_set(channel, name, value):
+        params.remove((name, value))
         continue
-      command = make_command[name](value)
+      builder = _COMMAND_BUILDERS[name]
+      command = builder(self, channel, value)
       if command:
         command_list.append(command)
 
-    for command in command_list:
-      self.send(command)
+    if command_list:
+      self._send_many(command_list, expect_reply=False)
 
     return len(command_list)
 
@@ -522,47 +721,34 @@ class FYGen(object):
       raise InvalidFrequencyError(
           'Please, provide freq_hz or freq_uhz, not both.')
 
-    prefix = 'RF' if channel == 1 else 'RM'
+    data = self._get_params(channel, p)
 
-    def send(code):
-      """self.send shortcut."""
-      return self.send(prefix + code)
+    if isinstance(params, str):
+      return data[params]
 
-    def get_waveform_name():
-      """Gets the waveform name from the signal generator."""
-      try:
-        return wavedef.get_name(self.device_name, int(send('W')), channel)
-      except wavedef.Error:
-        raise UnknownWaveformError('Unknown waveform index returned')
+    return data
 
-    def get_offset_volts():
-      """Gets offset volts, correcting for an "unsigned" bug in the fygen."""
-      offset_unsigned = int(send('O'))
-      if offset_unsigned > 0x80000000:
-        offset_unsigned = -(0x100000000 - offset_unsigned)
-      return float(offset_unsigned) / 1000
+  def _get_params(self, channel, names):
+    """Reads the named set() parameters from a channel with one write.
 
-    data = {}
+    Unlike get(), names is not checked for freq_hz and freq_uhz together.
 
-    # mapping of parameters to conversion functions.
-    conversions = {
-        'duty_cycle': lambda: float(send('D')) / 100000.0,
-        'enable': lambda: bool(int(send('N'))),
-        'freq_hz': lambda: int(send('F').split('.')[0]),
-        'freq_uhz': lambda: int(float(send('F')) * 1000000.0),
-        'offset_volts': get_offset_volts,
-        'phase_degrees': lambda: float(send('P')) / 1000.0,
-        'volts': lambda: float(send('A')) / 10000.0,
-        'wave': get_waveform_name,
-    }
-
-    for name in p:
-      if name not in conversions:
+    Returns a dictionary of name/value pairs.
+    """
+    prefix = _READ_PREFIXES[channel]
+
+    names = list(names)
+    for name in names:
+      if name not in _GET_CONVERSIONS:
         raise UnknownParameterError('Unknown get parameter: %s' % name)
-      data[name] = conversions[name]()
 
-    if isinstance(params, str):
-      return data[params]
+    # All queries are sent together and the responses are read back in order.
+    data = {}
+    if names:
+      responses = self._send_many(
+          [prefix + _GET_CONVERSIONS[name][0] for name in names])
+      for name, response in zip(names, responses):
+        data[name] = _GET_CONVERSIONS[name][1](self, channel, response)
 
     return data
 
@@ -611,18 +797,19 @@ class FYGen(object):
     if waveform_index < 1:
       raise UnknownWaveformError('waveform_index < 1')
 
-    if raw_values:
+    if raw_values is not None:
       if values is not None:
         raise RawValueConflictError(
             'Please do not provide both values and raw_values')
     else:
-      raw_values = list(_convert_values_to_raw_values(
-          values, min_value, max_value))
+      raw_values = _convert_values_to_raw_values(values, min_value, max_value)
+
+    data = _pack_raw_values(raw_values)
 
-    if len(raw_values) != value_count:
+    if len(data) != value_count * 2:
       raise ValueCountError(
           'Unexpected value array length.  expected %d, got %d' %
-          (value_count, len(raw_values)))
+          (value_count, len(data) // 2))
 
     for c in (0, 1):
       if self.is_serial and self.get(c, 'wave') == 'arb%u' % waveform_index:
@@ -630,21 +817,17 @@ class FYGen(object):
             'Can not update arb%u because it is active on channel %u' %
             (waveform_index, c))
 
-    data = []
-    for v in raw_values:
-      data.append(v & 255)  # lower 8 bits
-      data.append((v >> 8) & 63)  # upper 6 bits
-
     response = self.send('DDS_WAVE%u' % waveform_index)
     if self.is_serial and response != 'W':
       raise CommandNotAcknowledgedError('DDS_WAVE command was not acknowledged')
 
     if self.is_serial:
-      self.port.write(bytearray(data))
+      self.port.write(data)
     else:
-      for i in range(0, len(data), 16):
-        self.port.write(''.join('%02X' % d for d in data[i:i+16]))
-        self.port.write('\n')
+      # Print the data as hex, 16 bytes per line, with a single write.
+      hex_str = binascii.hexlify(data).decode('ascii').upper()
+      self.port.write(''.join(
+          hex_str[i:i+32] + '\n' for i in range(0, len(hex_str), 32)))
     response = self._recv('(Wave Data)').strip()
     if self.is_serial and response != 'HN':
       raise CommandNotAcknowledgedError('DDS_WAVE data was not accepted')
@@ -701,7 +884,7 @@ class FYGen(object):
       if freq_uhz is not None:
         if freq_uhz < 0:
           raise InvalidFrequencyError('frequency < 0')
-        commands.append('WF%s%014u' % (code, freq_uhz))
+        commands.append(f'WF{code}{int(freq_uhz):014d}')
 
     maybe_add_frequency('K', hop_freq_hz, hop_freq_uhz)
     maybe_add_frequency('M', fm_bias_freq_hz, fm_bias_freq_uhz)
@@ -711,35 +894,34 @@ class FYGen(object):
         raise InvalidModulationModeError('Modulation mode < 0')
       if mode > MODULATION_PM:
         raise InvalidModulationModeError('Modulation mode > 3')
-      commands.append('WPF%u' % mode)
+      commands.append(f'WPF{int(mode)}')
 
     if burst_count is not None:
       if burst_count < 1:
         raise InvalidBurstCycleCountError('Trigger burst count < 1')
-      commands.append('WPN%u' % burst_count)
+      commands.append(f'WPN{int(burst_count)}')
 
     if trigger is not None:
       if trigger < 0:
         raise InvalidTriggerModeError('Trigger mode < 0')
       if trigger > TRIGGER_EXTERNAL_DC:
         raise InvalidTriggerModeError('Trigger mode > 3')
-      commands.append('WPM%u' % trigger)
+      commands.append(f'WPM{int(trigger)}')
 
     if am_attenuation is not None:
       if am_attenuation < 0.0:
         raise InvalidAMAttenuationError('AM Ratio < 0')
       if am_attenuation > 2.0:
         raise InvalidAMAttenuationError('AM Ratio > 1')
-      commands.append('WPR%.1f' % (am_attenuation * 100.0))
+      commands.append(f'WPR{am_attenuation * 100.0:.1f}')
 
     if pm_bias_degrees is not None:
-      commands.append('WPP%.1f' % (pm_bias_degrees % 360.0))
+      commands.append(f'WPP{pm_bias_degrees % 360.0:.1f}')
 
-    for command in commands:
-      self.send(command)
+    if commands:
+      self._send_many(commands, expect_reply=False)
 
   # pylint: disable=too-many-locals
-  # pylint: disable=too-many-statements
   def set_sweep(
       self,
       enable=None,
@@ -801,21 +983,30 @@ class FYGen(object):
     """
     commands = []
 
+    sweep_values = (
+        start_freq_hz,
+        end_freq_hz,
+        start_volts,
+        end_volts,
+        start_offset_volts,
+        end_offset_volts,
+        start_duty_cycle,
+        end_duty_cycle,
+    )
+
     if mode is not None:
       if mode < 0 or mode > SWEEP_DUTY_CYCLE:
         raise InvalidSweepModeError('Invalid Sweep Mode: %s' % mode)
-      commands.append('SOB%u' % mode)
-    elif start_freq_hz is not None or end_freq_hz is not None:
-      mode = SWEEP_FREQUENCY
-    elif start_volts is not None or end_volts is not None:
-      mode = SWEEP_AMPLITUDE
-    elif start_offset_volts is not None or end_offset_volts is not None:
-      mode = SWEEP_OFFSET
-    elif start_duty_cycle is not None or end_duty_cycle is not None:
-      mode = SWEEP_DUTY_CYCLE
+      commands.append(f'SOB{int(mode)}')
+    else:
+      # Infer the mode from the first start/end value that was provided
+      for field, value in zip(_SWEEP_FIELDS, sweep_values):
+        if value is not None:
+          mode = field[2]
+          break
 
     if log_sweep is not None:
-      commands.append('SMO%u' % (1 if log_sweep else 0))
+      commands.append(f'SMO{1 if log_sweep else 0}')
 
     if source is not None:
       if source == SWEEP_SOURCE_TIME:
@@ -831,89 +1022,20 @@ class FYGen(object):
             'provided time_seconds with source == SWEEP_SOURCE_VCO_IN')
       if time_seconds <= 0:
         raise InvalidSweepTimeError('time_seconds <= 0')
-      commands.append('STI%.2f' % time_seconds)
-
-    if start_freq_hz is not None:
-      if mode != SWEEP_FREQUENCY:
-        raise InvalidModeError(
-            'using start_freq_hz when not in SWEEP_FREQUENCY mode.')
-      if start_freq_hz <= 0:
-        raise InvalidFrequencyError('start_freq_hz <= 0')
-      commands.append('SST%.1f' % start_freq_hz)
-
-    if end_freq_hz is not None:
-      if mode != SWEEP_FREQUENCY:
-        raise InvalidModeError(
-            'using end_freq_hz when not in SWEEP_FREQUENCY mode.')
-      if end_freq_hz <= 0:
-        raise InvalidFrequencyError('end_freq_hz <= 0')
-      commands.append('SEN%.1f' % end_freq_hz)
+      commands.append(f'STI{time_seconds:.2f}')
 
-    if start_volts is not None:
-      if mode != SWEEP_AMPLITUDE:
-        raise InvalidModeError(
-            'using start_volts when not in SWEEP_AMPLITUDE mode.')
-      if start_volts <= 0:
-        raise InvalidVoltageError('start_volts <= 0')
-      if start_volts > self.max_volts:
-        raise InvalidVoltageError('start_volts > %g' % self.max_volts)
-      commands.append('SST%.3f' % start_volts)
-
-    if end_volts is not None:
-      if mode != SWEEP_AMPLITUDE:
-        raise InvalidModeError(
-            'using end_volts when not in SWEEP_AMPLITUDE mode.')
-      if end_volts <= 0:
-        raise InvalidVoltageError('end_volts <= 0')
-      if end_volts > self.max_volts:
-        raise InvalidVoltageError('end_volts > %g' % self.max_volts)
-      commands.append('SEN%.3f' % end_volts)
-
-    if start_offset_volts is not None:
-      if mode != SWEEP_OFFSET:
-        raise InvalidModeError(
-            'using start_offset_volts when not in SWEEP_OFFSET mode.')
-      if start_offset_volts > self.max_volts:
-        raise InvalidVoltageError('start_offset_volts > %g' % self.max_volts)
-      # Bug: The offset volts parameter needs an additional offset added
-      commands.append('SST%.3f' % (start_offset_volts + 10.0))
-
-    if end_offset_volts is not None:
-      if mode != SWEEP_OFFSET:
-        raise InvalidModeError(
-            'using end_offset_volts when not in SWEEP_OFFSET mode.')
-      if end_offset_volts > self.max_volts:
-        raise InvalidVoltageError('end_offset_volts > %g' % self.max_volts)
-      # Bug: The offset volts parameter needs an additional offset added
-      commands.append('SEN%.3f' % (end_offset_volts + 10.0))
-
-    if start_duty_cycle is not None:
-      if mode != SWEEP_DUTY_CYCLE:
-        raise InvalidModeError(
-            'using start_duty_cycle when not in SWEEP_DUTY_CYCLE mode.')
-      if start_duty_cycle <= 0:
-        raise InvalidDutyCycleError('start_duty_cycle <= 0')
-      if start_duty_cycle >= 1:
-        raise InvalidDutyCycleError('start_duty_cycle >= 1')
-      commands.append('SST%.1f' % (start_duty_cycle * 100.0))
-
-    if end_duty_cycle is not None:
-      if mode != SWEEP_DUTY_CYCLE:
+    for field, value in zip(_SWEEP_FIELDS, sweep_values):
+      if value is None:
+        continue
+      name, code, field_mode, mode_name, format_value = field
+      if mode != field_mode:
         raise InvalidModeError(
-            'using end_duty_cycle when not in SWEEP_DUTY_CYCLE mode.')
-      if end_duty_cycle <= 0:
-        raise InvalidDutyCycleError('end_duty_cycle <= 0')
-      if end_duty_cycle >= 1:
-        raise InvalidDutyCycleError('end_duty_cycle >= 1')
-      commands.append('SEN%.1f' % (end_duty_cycle * 100.0))
+            'using %s when not in %s mode.' % (name, mode_name))
+      commands.append(code + format_value(self, name, value))
 
     if (enable is not None and not enable) or commands:
       # disable the sweep when changing any parameters
-      self.send('SBE0')
-
-
-    for command in commands:
-      self.send(command)
+      self._send_many(['SBE0'] + commands, expect_reply=False)
 
     # -- This should come last ---
     if enable is not None and enable:
@@ -925,8 +1047,7 @@ class FYGen(object):
             'fy.force_sweep_enable=True (assuming your object is called fy). '
             'The bug is that set sweep parameters are ignored so be careful '
             'what you connect the generator to if you force enable sweep.')
-      self.send('SBE1')
-  # pylint: enable=too-many-statements
+      self.send('SBE1', expect_reply=False)
   # pylint: enable=too-many-locals
 
   def set_measurement(
@@ -955,22 +1076,21 @@ class FYGen(object):
         raise InvalidGateTimeError(
             'Invalid gate time, please choose GATE_TIME_1S, GATE_TIME_10S or '
             'GATE_TIME_100S')
-      commands.append('WCG%u' % gate_time)
+      # Non-integer values are truncated, as with 'WCG%u'.
+      commands.append(_GATE_TIME_COMMANDS[int(gate_time)])
 
     if coupling is not None:
-      if coupling == COUPLING_DC:
-        commands.append('WCC1')
-      elif coupling == COUPLING_AC:
-        commands.append('WCC0')
-      else:
+      try:
+        commands.append(_COUPLING_COMMANDS[coupling])
+      except KeyError:
         raise InvalidCouplingError(
             'Invalid coupling.  please choose COUPLING_DC or COUPLING_AC')
 
     if reset_counter:
       commands.append('WCZ0')
 
-    for command in commands:
-      self.send(command)
+    if commands:
+      self._send_many(commands, expect_reply=False)
 
   def get_measurement(self, params=None):
     """Gets one or more measurement parameters.
@@ -1009,33 +1129,33 @@ class FYGen(object):
       extract_param = params
       params = (params,)
 
-    def read_frequency():
-      """Reads the current measurement frequency."""
-      try:
-        gate_time = int(self.send('RCG'))
-      except ValueError:
-        raise InvalidGateTimeError('RCG returned an unrecognized gate time.')
-      return float(self.send('RCF')) / (10.0 ** gate_time)
-
-    getters = {
-        'freq_hz': read_frequency,
-        'counter': lambda: int(self.send('RCC')),
-        'period_sec': lambda: float(self.send('RCT')) / 1000000000.0,
-        'positive_width_sec': lambda: float(
-            self.send('RC+')) / 1000000000.0,
-        'negative_width_sec': lambda: float(
-            self.send('RC-')) / 1000000000.0,
-        'duty_cycle': lambda: float(self.send('RCD')) / 1000.0,
-    }
-
-    results = {}
-
+    commands = []
     for param in params:
-      if param not in getters:
+      if param not in _MEASUREMENT_COMMANDS:
         raise UnknownParameterError(
             'Unknown parameter: %s.  Valid parameters are %s' %
-            (param, ', '.join(sorted(getters))))
-      results[param] = getters[param]()
+            (param, ', '.join(sorted(_MEASUREMENT_COMMANDS))))
+      if param == 'freq_hz':
+        commands.append('RCG')
+      commands.append(_MEASUREMENT_COMMANDS[param][0])
+
+    # All of the reads are sent together and the responses are read back in
+    # order.
+    responses = iter(self._send_many(commands))
+
+    results = {}
+    for param in params:
+      divisor = _MEASUREMENT_COMMANDS[param][1]
+      if param == 'freq_hz':
+        try:
+          gate_time = int(next(responses))
+        except ValueError:
+          raise InvalidGateTimeError('RCG returned an unrecognized gate time.')
+        results[param] = float(next(responses)) / (10.0 ** gate_time)
+      elif divisor is None:
+        results[param] = int(next(responses))
+      else:
+        results[param] = float(next(responses)) / divisor
 
     if extract_param:
       return results[extract_param]
@@ -1046,7 +1166,7 @@ class FYGen(object):
     """Saves current device state to the given index (internal to the device).
 
     Note that index 1 is documented as the startup settings."""
-    self.send('USN%02u' % index)
+    self.send('USN%02u' % index, expect_reply=False)
 
   def load(self, index):
     """Restore device state from a given index.
@@ -1054,30 +1174,51 @@ class FYGen(object):
     This index is expected to have been saved earlier in time.  Note that the
     state is internal to the device.  The client side (python) does not know how
     the device state changed without further queries."""
-    self.send('ULN%02u' % index)
+    self.send('ULN%02u' % index, expect_reply=False)
+    # Remembered settings might no longer match the device.
+    self._sync_state.clear()
+    self._settings.clear()
 
-  # pylint: disable=unused-argument
   def set_synchronization(
       self,
       wave=None,
       freq=None,
       volts=None,
       offset_volts=None,
-      duty_cycle=None):
+      duty_cycle=None,
+      *,
+      skip_unchanged=False):
     """Configures parameter synchronization.
 
     Values set to True enable synchronization.  False disables synchronization,
     the default of None does not change synchronization.
+
+    If skip_unchanged is True, modes that this object last set or read in the
+    requested state are not sent.  Only use it if nothing else (the front
+    panel, another program) changes synchronization on the device.
     """
-    for arg, val in six.iteritems(locals()):
-      if arg in SYNC_MODES and val is not None:
-        if val:
-          self.send('USA%u' % SYNC_MODES[arg])
-        else:
-          self.send('USD%u' % SYNC_MODES[arg])
-  # pylint: enable=unused-argument
-
-  def get_synchronization(self, params=None):
+    changes = []
+    for arg, val in (
+        ('wave', wave),
+        ('freq', freq),
+        ('volts', volts),
+        ('offset_volts', offset_volts),
+        ('duty_cycle', duty_cycle)):
+      if val is None:
+        continue
+      if skip_unchanged and self._sync_state.get(arg) == bool(val):
+        continue
+      changes.append((arg, bool(val)))
+
+    if changes:
+      self._send_many(
+          [('USA%u' if val else 'USD%u') % SYNC_MODES[arg]
+           for arg, val in changes],
+          expect_reply=False)
+    for arg, val in changes:
+      self._update_state(self._sync_state, arg, val)
+
+  def get_synchronization(self, params=None, *, cached=False):
     """Returns the current state of sync modes.
 
     Available parameters include wave, freq, volts, offset, and duty_cycle
@@ -1088,6 +1229,10 @@ class FYGen(object):
     is returned.
 
     If params is None, a dictionary of all known parameters is returned.
+
+    If cached is True, modes that were already read or set through this object
+    (since the last load()) are not read from the device again.  Only use it if
+    nothing else changes the synchronization settings on the device.
     """
     if params is None:
       p_list = sorted(SYNC_MODES)
@@ -1096,39 +1241,76 @@ class FYGen(object):
     else:
       p_list = params
 
-    data = {}
     for p in p_list:
       if p not in SYNC_MODES:
         raise InvalidSynchronizationMode(
             'Invalid synchronization mode: %s' % p)
-      data[p] = bool(int(self.send('RSA%u' % SYNC_MODES[p])))
+
+    missing = [p for p in p_list if not cached or p not in self._sync_state]
+    if missing:
+      responses = self._send_many(
+          ['RSA%u' % SYNC_MODES[p] for p in missing])
+      for p, response in zip(missing, responses):
+        self._sync_state[p] = bool(int(response))
+
+    data = {}
+    for p in p_list:
+      data[p] = self._sync_state[p]
 
     if isinstance(params, str):
       return data[params]
 
     return data
 
-  def set_buzzer(self, enable):
-    """Enables/disables the buzzer."""
-    self.send('UBZ%d' % (1 if enable else 0))
+  def set_buzzer(self, enable, *, skip_unchanged=False):
+    """Enables/disables the buzzer.
+
+    If skip_unchanged is True, nothing is sent when this object last set or
+    read the buzzer in the same state.  Only use it if nothing else changes
+    the buzzer setting on the device.
+    """
+    enable = bool(enable)
+    if skip_unchanged and self._settings.get('buzzer') == enable:
+      return
+    self.send('UBZ%d' % (1 if enable else 0), expect_reply=False)
+    self._update_state(self._settings, 'buzzer', enable)
 
   def get_buzzer(self):
     """Returns True if the buzzer is enabled."""
-    return bool(int(self.send('RBZ')))
+    enable = bool(int(self.send('RBZ')))
+    self._settings['buzzer'] = enable
+    return enable
 
-  def set_uplink(self, is_master=None, enable=None):
+  def set_uplink(self, is_master=None, enable=None, *, skip_unchanged=False):
     """Sets uplink mode as master or slave.
 
-    All parameters are optional.
+    All parameters are optional.  If skip_unchanged is True, settings that
+    this object last set or read in the requested state are not sent.  Only
+    use it if nothing else changes the uplink settings on the device.
     """
+    if skip_unchanged:
+      if self._settings.get('uplink_enable') == enable:
+        enable = None
+      if self._settings.get('is_master') == is_master:
+        is_master = None
+
+    commands = []
     if enable is not None and not enable:
-      self.send('UUL0')
+      commands.append('UUL0')
 
     if is_master is not None:
-      self.send('UMS%d' % (0 if is_master else 1))
+      commands.append('UMS%d' % (0 if is_master else 1))
 
     if enable is not None and enable:
-      self.send('UUL1')
+      commands.append('UUL1')
+
+    if commands:
+      self._send_many(commands, expect_reply=False)
+
+    if enable is not None:
+      self._update_state(self._settings, 'uplink_enable', bool(enable))
+    if is_master is not None:
+      self._update_state(self._settings, 'is_master', bool(is_master))
 
   def get_uplink(self, params=None):
     """Sets uplinks settings.
@@ -1150,37 +1332,81 @@ class FYGen(object):
     elif params is None:
       params = ('enable', 'is_master')
 
-    results = {}
+    params = list(params)
     for parm in params:
-      if parm == 'enable':
-        results[parm] = bool(int(self.send('RUL')))
-      elif parm == 'is_master':
-        results[parm] = not bool(int(self.send('RMS')))
-      else:
+      if parm not in _UPLINK_COMMANDS:
         raise UnknownParameterError('Unknown uplink parameter: %s' % parm)
 
+    responses = []
+    if params:
+      responses = self._send_many([_UPLINK_COMMANDS[p][0] for p in params])
+
+    results = {}
+    for parm, response in zip(params, responses):
+      _, convert, setting = _UPLINK_COMMANDS[parm]
+      results[parm] = convert(response)
+      self._settings[setting] = results[parm]
+
     if extract_parm:
       return results[extract_parm]
 
     return results
 
   def get_id(self):
-    """Returns the device id."""
-    return self.send('UID')
+    """Returns the device id, which is only read from the device once."""
+    if not self._id:
+      self._id = self.send('UID')
+    return self._id
 
   def get_model(self):
-    """Returns the device model."""
-    return self.send('UMO')
-
-  def _recv(self, command):
-    """Waits for device."""
+    """Returns the device model, which is only read from the device once."""
+    if not self._model:
+      self._model = self.send('UMO')
+    return self._model
+
+  def invalidate_identity_cache(self):
+    """Makes the next get_id() and get_model() calls read from the device."""
+    self._id = None
+    self._model = None
+
+  def _recv(self, command, decode=True):
+    """Waits for device.  Returns bytes instead of a string if not decode."""
     if not self.is_serial:
       return ''
-    response = self.port.read_until(size=MAX_READ_SIZE).decode('utf8')
+    response = self.port.read_until(size=MAX_READ_SIZE)
+    self._port_idle = response.endswith(b'\n')
     if self.debug_level:
-      sys.stdout.write('%s -> %s\n' % (command.strip(), response.strip()))
-    return response
+      sys.stdout.write('%s -> %s\n' % (
+          command.strip(), response.decode('utf8').strip()))
+    return response.decode('utf8') if decode else response
+
+
+def _enable_low_latency(port):
+  """Sets ASYNC_LOW_LATENCY on a serial port, if supported.
+
+  USB serial adapters (FTDI and friends) otherwise hold received bytes for up
+  to 16ms before passing them along, which adds to every response.
+  """
+  try:
+    port.set_low_latency_mode(True)
+  except (AttributeError, ValueError, IOError, OSError):
+    pass  # Not supported by this pyserial version, OS, or driver.
+
+def _set_buffer_size(port):
+  """Enlarges the driver buffers of a serial port, if supported.
 
+  Only pyserial on Windows supports this.  A batch of commands then fits in
+  one driver buffer instead of being drained in pieces.
+  """
+  try:
+    port.set_buffer_size(rx_size=SERIAL_BUFFER_SIZE, tx_size=SERIAL_BUFFER_SIZE)
+  except (AttributeError, ValueError, IOError, OSError):
+    pass  # Not supported by this pyserial version, OS, or driver.
+
+@functools.lru_cache(maxsize=256)
+def _get_wave_name(device_name, wave_id, channel):
+  """Memoized wavedef.get_name(), as get() is often polled for the wave."""
+  return wavedef.get_name(device_name, wave_id, channel)
 
 def _make_command(channel, suffix):
   """Creates a generic command.
@@ -1192,11 +1418,8 @@ def _make_command(channel, suffix):
   Raises:
     InvalidChannelError: if any channel other than 0 or 1 is given.
   """
-  if channel == 0:
-    return 'WM' + suffix
-
-  if channel == 1:
-    return 'WF' + suffix
+  if channel in (0, 1):
+    return _WRITE_PREFIXES[channel] + suffix
 
   raise InvalidChannelError(
       'Invalid channel: %s.  Only 0 or 1 is supported' % channel)
@@ -1224,7 +1447,7 @@ def _make_wave_command(channel, device_name, wave):
     raise UnknownWaveformError(
         'Invalid waveform index %d.  Index must be >= 0' % wave)
 
-  return _make_command(channel, 'W%02u' % wave)
+  return _make_command(channel, f'W{int(wave):02d}')
 
 
 def _make_freq_uhz_command(channel, freq_uhz, include_decimal=False):
@@ -1243,14 +1466,15 @@ def _make_freq_uhz_command(channel, freq_uhz, include_decimal=False):
     raise InvalidFrequencyError('Invalid freq_uhz: %d' % freq_uhz)
 
   if include_decimal:
-    s = 'F%015.6f' % (freq_uhz/1e6)
-    return _make_command(channel, s)
+    return _make_command(channel, f'F{freq_uhz / 1e6:015.6f}')
   else:
-    return _make_command(channel, 'F%014u' % freq_uhz)
+    return _make_command(channel, f'F{int(freq_uhz):014d}')
 
 
 def _make_freq_hz_command(channel, freq_hz, include_decimal=False):
-  return _make_freq_uhz_command(channel, freq_hz * 1000000, include_decimal=include_decimal)
+  """Create a frequency command string from a frequency in Hz."""
+  return _make_freq_uhz_command(
+      channel, freq_hz * 1000000, include_decimal=include_decimal)
 
 
 def _make_volts_command(channel, max_volts, volts):
@@ -1261,7 +1485,7 @@ def _make_volts_command(channel, max_volts, volts):
   if volts > max_volts:
     raise InvalidVoltageError('volts is too high: %g > %g' % (volts, max_volts))
 
-  return _make_command(channel, 'A%.2f' % volts)
+  return _make_command(channel, f'A{volts:.2f}')
 
 
 def _make_duty_cycle_command(channel, duty_cycle):
@@ -1272,7 +1496,7 @@ def _make_duty_cycle_command(channel, duty_cycle):
   if duty_cycle >= 1.0:
     raise InvalidDutyCycleError('duty_cycle >= 1: %g' % duty_cycle)
 
-  return _make_command(channel, 'D%.1f' % (duty_cycle * 100.0))
+  return _make_command(channel, f'D{duty_cycle * 100.0:.1f}')
 
 
 def _make_offset_volts_command(channel, min_volts, max_volts, volts):
@@ -1285,12 +1509,12 @@ def _make_offset_volts_command(channel, min_volts, max_volts, volts):
     raise InvalidVoltageOffsetError(
         'offset_volts is too high: %g > %g' % (volts, max_volts))
 
-  return _make_command(channel, 'O%.2f' % volts)
+  return _make_command(channel, f'O{volts:.2f}')
 
 
 def _make_phase_command(channel, phase_degrees):
   """Creates a phase string."""
-  return _make_command(channel, 'P%.3f' % (phase_degrees % 360))
+  return _make_command(channel, f'P{phase_degrees % 360:.3f}')
 
 
 def _make_enable_command(channel, enable):
@@ -1302,8 +1526,166 @@ def _make_enable_command(channel, enable):
   """
   return _make_command(channel, 'N' + ('1' if enable else '0'))
 
+# Map various parameter names to functions that check arguments and generate
+# the correct low-level string.  Each is called as builder(fy, channel, value).
+_COMMAND_BUILDERS = {
+    'duty_cycle': lambda fy, channel, v: _make_duty_cycle_command(channel, v),
+    'enable': lambda fy, channel, v: _make_enable_command(channel, v),
+    'freq_hz': lambda fy, channel, v: _make_freq_hz_command(
+        channel, v, include_decimal=fy.frequency_includes_decimal),
+    'freq_uhz': lambda fy, channel, v: _make_freq_uhz_command(
+        channel, v, include_decimal=fy.frequency_includes_decimal),
+    'offset_volts': lambda fy, channel, v: _make_offset_volts_command(
+        channel, fy.min_volts, fy.max_volts, v),
+    'phase_degrees': lambda fy, channel, v: _make_phase_command(channel, v),
+    'volts': lambda fy, channel, v: _make_volts_command(
+        channel, fy.max_volts, v),
+    'wave': lambda fy, channel, v: _make_wave_command(
+        channel, fy.device_name, v),
+}
+
+@functools.lru_cache(maxsize=None)
+def _import_numpy():
+  """Imports numpy on first use.  Returns None if it is not installed."""
+  try:
+    import numpy  # pylint: disable=import-outside-toplevel
+  except ImportError:
+    return None
+  return numpy
+
+def _pack_raw_values(raw_values):
+  """Packs 14-bit raw_values into the byte layout used by DDS_WAVE.
+
+  Each value becomes a little-endian 16 bit word: the lower 8 bits followed
+  by the upper 6 bits.  raw_values can be any iterable (list, generator,
+  array) of integers.  Uses numpy when it is installed.
+
+  Raises TypeError for non-integer values and RawValueRangeError for values
+  outside of 0..16383.
+  """
+  numpy = _import_numpy()
+  if numpy is None:
+    data = array.array('H', _check_raw_values(raw_values))
+    if sys.byteorder != 'little':
+      data.byteswap()
+    return data.tobytes()
+
+  if not isinstance(raw_values, numpy.ndarray):
+    raw_values = list(raw_values)
+  raw = numpy.asarray(raw_values)
+  if raw.size == 0:
+    return b''
+  if raw.dtype.kind not in 'biu':
+    raise TypeError('raw_values must be integers, got %s' % raw.dtype)
+  if raw.min() < 0 or raw.max() > 0x3FFF:
+    raise RawValueRangeError('raw_values must be within 0..16383')
+  return raw.astype('<u2').tobytes()
+
+def _check_raw_values(raw_values):
+  """Yields raw_values, raising if any of them are not 14-bit integers."""
+  for v in raw_values:
+    if v & 0x3FFF != v:  # also raises TypeError for floats
+      raise RawValueRangeError('raw_values must be within 0..16383')
+    yield v
+
+def _convert_wave(fy, channel, response):
+  """Converts a waveform index from the signal generator to a name."""
+  try:
+    return _get_wave_name(fy.device_name, int(response), channel)
+  except wavedef.Error:
+    raise UnknownWaveformError('Unknown waveform index returned')
+
+def _convert_offset_volts(unused_fy, unused_channel, response):
+  """Converts offset volts, working around an "unsigned" fygen bug."""
+  # Sign extend the 32-bit value
+  offset = int(response) & 0xFFFFFFFF
+  offset -= (offset & 0x80000000) << 1
+  return offset / 1000.0
+
+# Map get() parameter names to query codes and functions that convert the
+# response.  Each is called as convert(fy, channel, response).
+_GET_CONVERSIONS = {
+    'duty_cycle': ('D', lambda fy, channel, r: float(r) / 100000.0),
+    'enable': ('N', lambda fy, channel, r: bool(int(r))),
+    'freq_hz': ('F', lambda fy, channel, r: int(r.split('.')[0])),
+    'freq_uhz': ('F', lambda fy, channel, r: int(float(r) * 1000000.0)),
+    'offset_volts': ('O', _convert_offset_volts),
+    'phase_degrees': ('P', lambda fy, channel, r: float(r) / 1000.0),
+    'volts': ('A', lambda fy, channel, r: float(r) / 10000.0),
+    'wave': ('W', _convert_wave),
+}
+
+def _format_sweep_freq(unused_fy, name, freq_hz):
+  """Checks and formats a set_sweep() frequency."""
+  if freq_hz <= 0:
+    raise InvalidFrequencyError('%s <= 0' % name)
+  return f'{freq_hz:.1f}'
+
+def _format_sweep_volts(fy, name, volts):
+  """Checks and formats a set_sweep() amplitude."""
+  if volts <= 0:
+    raise InvalidVoltageError('%s <= 0' % name)
+  if volts > fy.max_volts:
+    raise InvalidVoltageError('%s > %g' % (name, fy.max_volts))
+  return f'{volts:.3f}'
+
+def _format_sweep_offset_volts(fy, name, offset_volts):
+  """Checks and formats a set_sweep() voltage offset."""
+  if offset_volts > fy.max_volts:
+    raise InvalidVoltageError('%s > %g' % (name, fy.max_volts))
+  # Bug: The offset volts parameter needs an additional offset added
+  return f'{offset_volts + 10.0:.3f}'
+
+def _format_sweep_duty_cycle(unused_fy, name, duty_cycle):
+  """Checks and formats a set_sweep() duty cycle."""
+  if duty_cycle <= 0:
+    raise InvalidDutyCycleError('%s <= 0' % name)
+  if duty_cycle >= 1:
+    raise InvalidDutyCycleError('%s >= 1' % name)
+  return f'{duty_cycle * 100.0:.1f}'
+
+# set_sweep() start/end arguments, in argument order.  Each entry is
+# (name, command, mode, mode name, format_value(fy, name, value)).
+_SWEEP_FIELDS = (
+    ('start_freq_hz', 'SST', SWEEP_FREQUENCY, 'SWEEP_FREQUENCY',
+     _format_sweep_freq),
+    ('end_freq_hz', 'SEN', SWEEP_FREQUENCY, 'SWEEP_FREQUENCY',
+     _format_sweep_freq),
+    ('start_volts', 'SST', SWEEP_AMPLITUDE, 'SWEEP_AMPLITUDE',
+     _format_sweep_volts),
+    ('end_volts', 'SEN', SWEEP_AMPLITUDE, 'SWEEP_AMPLITUDE',
+     _format_sweep_volts),
+    ('start_offset_volts', 'SST', SWEEP_OFFSET, 'SWEEP_OFFSET',
+     _format_sweep_offset_volts),
+    ('end_offset_volts', 'SEN', SWEEP_OFFSET, 'SWEEP_OFFSET',
+     _format_sweep_offset_volts),
+    ('start_duty_cycle', 'SST', SWEEP_DUTY_CYCLE, 'SWEEP_DUTY_CYCLE',
+     _format_sweep_duty_cycle),
+    ('end_duty_cycle', 'SEN', SWEEP_DUTY_CYCLE, 'SWEEP_DUTY_CYCLE',
+     _format_sweep_duty_cycle),
+)
+
 def _convert_values_to_raw_values(values, min_value, max_value):
-  """Converts an array of values to an array of raw_values."""
+  """Converts an array of values to an array of raw_values.
+
+  Returns a numpy array if numpy is installed, otherwise a generator.
+  """
+  max_raw_value = 16384  # 14-bit
+  numpy = _import_numpy()
+  if numpy is not None:
+    if isinstance(values, (list, tuple, numpy.ndarray)):
+      values = numpy.asarray(values, dtype=numpy.float64)
+    else:
+      values = numpy.fromiter(values, dtype=numpy.float64)
+    raw = (values - min_value) * max_raw_value / (max_value - min_value)
+    if not numpy.isfinite(raw).all():
+      raise ValueError('cannot convert non-finite value to a raw value')
+    return numpy.clip(raw, 0, max_raw_value - 1).astype(numpy.int64)
+
+  return _convert_values_to_raw_values_slow(values, min_value, max_value)
+
+def _convert_values_to_raw_values_slow(values, min_value, max_value):
+  """Pure Python version of _convert_values_to_raw_values."""
   max_raw_value = 16384  # 14-bit
   for v in values:
     raw_v = int((v - min_value) * max_raw_value / (max_value - min_value))
@@ -1,7 +1,8 @@
 """Generates online documentation for fygen."""
 
+import functools
+import io
 import sys
-import six
 
 import wavedef
 
@@ -48,7 +49,7 @@ required.
   - The code is lint clean (using the provided lint rules).
   - Each function was validated with a real FY2300.
   - Open source, pure Python.
-  - Supports Python 2 and Python 3.
+  - Supports Python 3.
   - Supports most OSes (Linux, Windows, Mac)
   - Comprehensive usage documentation and examples are included.
 
@@ -70,24 +71,26 @@ please do not use this software.
 """
 
 _HELP['Prerequisites'] = """
-You may use either Python 2 or Python 3.
+You will need Python 3 and the
+[pyserial](https://pypi.org/project/pyserial/) package.  The process of
+installing this package will vary depending on your environment.  Some
+examples:
 
-For either, you will need the [pyserial](https://pypi.org/project/pyserial/)
-package.  The process of installing this package will vary depending on your
-environment.  Some examples:
+Ubuntu:
 
-Ubuntu + Python2:
+    sudo apt install python3-serial
 
-    sudo apt install python-serial
+pip:
 
-Ubuntu + Python3:
+    pip3 install pyserial
 
-    sudo apt install python3-serial
+Installing [numpy](https://numpy.org/) is optional.  If it is available,
+`set_waveform()` uses it to pack waveform data more quickly.
 
 If you plan on using this library interactively, I recommend trying
 [ipython](ipython.org), which can be easily installed in Ubuntu via:
 
-    sudo apt install ipython ipython3
+    sudo apt install ipython3
 """
 
 _HELP['Basic Usage'] = """
@@ -105,6 +108,13 @@ value.
     # so you might not get the waveform you ask for
     fy = fygen.FyGen(device_name='fy2300')
     
+If several scripts or modules run in the same process, they can share one
+connection instead of each opening (and initializing) the port again.
+`FYGen.shared()` takes the same arguments as `FYGen()`, but returns the
+existing object for that serial path (or port) if there is one:
+
+    fy = fygen.FYGen.shared('/dev/ttyUSB0', debug_level=1)
+
 Once connected, this command will setup a 1Mhz sin wave on the main channel:
 
     fy.set(
@@ -148,6 +158,17 @@ You can use a python `dict` to hold settings:
     ch2_settings.update({'channel': fygen.CH2, 'volts': 1})
     fy.set(**ch2_settings)
     
+Several settings can be sent to the device together, which is quicker than
+sending them one at a time.  Inside of a `batched()` block, commands are
+queued and then written all at once when the block ends:
+
+    with fy.batched():
+      fy.set(fygen.CH1, wave='sin', freq_hz=1e6, enable=True)
+      fy.set(fygen.CH2, wave='square', freq_hz=1e6, enable=True)
+
+Commands that read from the device, such as `get()`, can not be used inside
+of a `batched()` block.
+
 See more docs on set
 
     help(fygen.FYGen.set)
@@ -155,6 +176,10 @@ See more docs on set
 Or online help:
 
     fygen.help()
+
+Help sections can be selected by number or by title:
+
+    fygen.help('Sweep')
 """
 
 _HELP['Low Level Access'] = """
@@ -398,6 +423,13 @@ Or all parameters:
 
     fy.get_synchronization()
 
+If nothing else changes the synchronization settings (such as the front
+panel), pass `cached=True` to reuse states that `fygen` has already read or
+set, instead of reading them from the device again.  Calling `load()` forgets
+them:
+
+    fy.get_synchronization(cached=True)
+
 See `help(fygen.FYGen.get_synchronization)` and
 `help(fygen.FYGen.set_synchronization)` for more information.
 """
@@ -624,6 +656,60 @@ class UnknownDeviceError(Error):
   """An unknown device was passed."""
 
 
+def _heading(title, markdown_format):
+  """Common heading generator."""
+  if markdown_format:
+    return '# %s\n' % title
+  return title + '\n' + ('-' * 80) + '\n\n'
+
+def _precompute():
+  """Renders the static sections and tables of contents once."""
+  toc = {}
+  rendered = {}
+  for markdown_format in (False, True):
+    lines = [_heading('Other Help Sections', markdown_format)]
+    for n, title in enumerate(SECTIONS):
+      cmd = 'fygen.help(%u)' % n
+      lines.append('  %-20s %s\n' % (cmd, title))
+    lines.append('\n')
+    toc[markdown_format] = ''.join(lines)
+
+    # None marks a section that is rendered on demand.
+    rendered[markdown_format] = tuple(
+        ''.join((_heading(title, markdown_format), _HELP[title], '\n'))
+        if title in _HELP else None
+        for title in SECTIONS)
+  return rendered, toc
+
+# Rendered text, keyed by markdown_format.  _RENDERED values are tuples
+# indexed by section number.
+_RENDERED, _TOC = _precompute()
+
+_SECTION_INDEX = {title: n for n, title in enumerate(SECTIONS)}
+
+def _render_section(section, device, markdown_format):
+  """Returns the text of a single help section."""
+  if isinstance(section, str):
+    try:
+      section = _SECTION_INDEX[section]
+    except KeyError:
+      raise InvalidHelpSectionError('Invalid help section: %s' % section)
+
+  try:
+    rendered = _RENDERED[markdown_format][section]
+  except IndexError:
+    raise InvalidHelpSectionError(
+        'Invalid help section: %s, maximum value is %u' %
+        (section, len(SECTIONS) - 1))
+
+  if rendered is None:
+    # Only 'Available Waveforms' depends on the device.
+    rendered = ''.join((
+        _heading(SECTIONS[section], markdown_format),
+        _available_waveforms(device, markdown_format),
+        '\n'))
+  return rendered
+
 # pylint: disable=redefined-builtin
 def help(
     section,
@@ -634,54 +720,25 @@ def help(
   """Generates help text.
 
   Args:
-    section: A section number.
+    section: A section number or title, or a list of them.
     device: Which device to create help for.
     fout: Where to stream the help text.
     show_other_sections: Whether or not to output a table of contents.
   """
   if isinstance(section, (list, tuple)):
-    # recursively call subsections
-    for s in section:
-      help(s, device, fout, False)
+    fout.write(''.join(
+        _render_section(s, device, markdown_format) for s in section))
     return
 
-  if section >= len(SECTIONS):
-    raise InvalidHelpSectionError(
-        'Invalid help section: %s, maximum value is %u' %
-        (section, len(SECTIONS) - 1))
-
-  def heading(title):
-    """Common heading generator."""
-    if markdown_format:
-      fout.write('# %s\n' % title)
-    else:
-      fout.write(title)
-      fout.write('\n')
-      fout.write('-' * 80)
-      fout.write('\n\n')
-
-  title = SECTIONS[section]
-  heading(title)
-
-  if title == 'Available Waveforms':
-    body = _available_waveforms(device, markdown_format)
-  else:
-    body = _HELP[title]
-
-  fout.write(body)
-  fout.write('\n')
-
+  text = _render_section(section, device, markdown_format)
   if show_other_sections:
-    heading('Other Help Sections')
-    for n, title in enumerate(SECTIONS):
-      cmd = 'fygen.help(%u)' % n
-      fout.write('  %-20s %s\n' % (cmd, title))
-
-    fout.write('\n')
+    text += _TOC[markdown_format]
+  fout.write(text)
 # pylint: enable=redefined-builtin
 
+@functools.lru_cache(maxsize=None)
 def _available_waveforms(device, markdown_format):
-  wf_docs = six.StringIO()
+  wf_docs = io.StringIO()
   try:
     wavedef.help(device, wf_docs, markdown_format)
   except wavedef.Error as e:
@@ -1,12 +1,17 @@
 """Unit tests for fygen module."""
 
+import collections
+import io
 import unittest
-import six
 
 import fygen
 import fygen_help
 from wavedef import SUPPORTED_DEVICES
 
+# Expected DDS_WAVE data for [-1.0, 0.0, 1.0, 0.0] and [1, 2, 3, 4] waves.
+_WAVE_DATA = '00000020FF3F002000000020FF3F0020\n' * 1024
+_RAW_WAVE_DATA = '01000200030004000100020003000400\n' * 1024
+
 # pylint: disable=too-many-public-methods
 # pylint: disable=invalid-name
 # pylint: disable=too-many-lines
@@ -14,14 +19,20 @@ from wavedef import SUPPORTED_DEVICES
 class FakeSerial(object):
   """Fake serial object for when more interaction is required."""
   def __init__(self, read_lines):
-    self.read_lines = read_lines
-    self.write_lines = []
+    self.read_lines = collections.deque(read_lines)
+    self.writes = []
+    self.reset_count = 0
+
+  @property
+  def write_lines(self):
+    """Decoded data from each write() call."""
+    return [w.decode('utf8') for w in self.writes]
 
   def getvalue(self):
-    return ''.join(self.write_lines)
+    return b''.join(self.writes).decode('utf8')
 
   def write(self, line):
-    self.write_lines.append(line.decode('utf8'))
+    self.writes.append(line)
 
   # pylint: disable=unused-argument
   # pylint: disable=no-self-use
@@ -32,24 +43,53 @@ class FakeSerial(object):
     return '\n'
 
   def reset_input_buffer(self):
-    pass
+    self.reset_count += 1
 
   def reset_output_buffer(self):
     pass
 
   def read_until(self, terminator='\n', size=0):
     """fake read_until method."""
-    r = self.read_lines[0]
-    del self.read_lines[0]
-    return r
+    return self.read_lines.popleft()
   # pylint: enable=unused-argument
   # pylint: enable=no-self-use
 
 
+def make_serial_fygen(read_lines, read_before_write=False, **kwargs):
+  """Returns (fy, fs): a FYGen that talks serial protocol to a FakeSerial."""
+  fs = FakeSerial(read_lines)
+  fy = fygen.FYGen(port=fs, **kwargs)
+  fy.is_serial = True
+  fy.read_before_write = read_before_write
+  return fy, fs
+
+
+# pylint: disable=too-few-public-methods
+class LowLatencySerial(object):
+  """Records set_low_latency_mode() and set_buffer_size() calls."""
+  def __init__(self, error=None):
+    self.error = error
+    self.low_latency = None
+    self.buffer_sizes = None
+
+  def set_low_latency_mode(self, enable):
+    """fake set_low_latency_mode method."""
+    if self.error:
+      raise self.error
+    self.low_latency = enable
+
+  def set_buffer_size(self, rx_size=None, tx_size=None):
+    """fake set_buffer_size method."""
+    if self.error:
+      raise self.error
+    self.buffer_sizes = (rx_size, tx_size)
+# pylint: enable=too-few-public-methods
+
+
 class TestFYGen(unittest.TestCase):
   """Test harness for FYGen."""
   def setUp(self):
-    self.output = six.StringIO()
+    self.output = io.StringIO()
     self.fy = fygen.FYGen(
         port=self.output,
         init_state=False,
@@ -59,23 +99,49 @@ class TestFYGen(unittest.TestCase):
   def tearDown(self):
     self.fy.close()
 
+  def pop_output(self):
+    """Returns everything written to self.output and clears it."""
+    value = self.output.getvalue()
+    self.output.seek(0)
+    self.output.truncate()
+    return value
+
   def test_help(self):
     """Asserts that all help sections render."""
     for section in range(len(fygen_help.SECTIONS)):
       fygen.help(section, fout=self.output)
-      self.assertIn('Other Help Sections', self.output.getvalue())
+      self.assertIn('Other Help Sections', self.pop_output())
 
   def test_help_device(self):
     """Tests calling help with a device name."""
     for section in range(len(fygen_help.SECTIONS)):
       fygen.help(section, 'fy2300', self.output)
-      self.assertIn('Other Help Sections', self.output.getvalue())
+      self.assertIn('Other Help Sections', self.pop_output())
 
   def test_help_invalid_section(self):
     """Provides an invalid help section number."""
     with self.assertRaises(fygen.HelpError):
       fygen.help(len(fygen_help.SECTIONS))
 
+  def test_help_by_title(self):
+    """Selects help sections by title."""
+    by_number = io.StringIO()
+    fygen.help(fygen_help.SECTIONS.index('Sweep'), fout=by_number)
+    fygen.help('Sweep', fout=self.output)
+    self.assertEqual(by_number.getvalue(), self.output.getvalue())
+
+    with self.assertRaises(fygen.HelpError):
+      fygen.help('No Such Section')
+
+  def test_help_section_list(self):
+    """Renders a list of sections in markdown format."""
+    fygen_help.help(
+        [0, 'Sweep'], fout=self.output, markdown_format=True)
+    output = self.output.getvalue()
+    self.assertTrue(output.startswith('# Introduction\n'))
+    self.assertIn('# Sweep\n', output)
+    self.assertNotIn('Other Help Sections', output)
+
   def test_get_version(self):
     """Tests the version command."""
     self.assertEqual(1.0, fygen.get_version())
@@ -96,15 +162,158 @@ class TestFYGen(unittest.TestCase):
     self.assertIn('WMW01\n', val)
     self.assertIn('WMA0.10\n', val)
 
+  def test_shared(self):
+    """Tests that shared() reuses one object per port."""
+    # pylint: disable=protected-access
+    self.addCleanup(fygen.FYGen._shared_instances.clear)
+    # pylint: enable=protected-access
+    fy = fygen.FYGen.shared(port=self.output, init_state=False)
+    self.assertIs(fy, fygen.FYGen.shared(port=self.output))
+    other = fygen.FYGen.shared(port=io.StringIO())
+    self.assertIsNot(fy, other)
+    other.close()
+    fy.close()
+    fy2 = fygen.FYGen.shared(port=self.output)
+    self.assertIsNot(fy, fy2)
+    fy2.close()
+
+  def test_enable_low_latency(self):
+    """Tests low latency mode is requested and failures are ignored."""
+    # pylint: disable=protected-access
+    port = LowLatencySerial()
+    fygen._enable_low_latency(port)
+    self.assertTrue(port.low_latency)
+
+    fygen._enable_low_latency(LowLatencySerial(ValueError('not supported')))
+    fygen._enable_low_latency(object())
+    # pylint: enable=protected-access
+
+  def test_set_buffer_size(self):
+    """Tests buffer sizes are requested and failures are ignored."""
+    # pylint: disable=protected-access
+    port = LowLatencySerial()
+    fygen._set_buffer_size(port)
+    self.assertEqual((4096, 4096), port.buffer_sizes)
+
+    fygen._set_buffer_size(LowLatencySerial(ValueError('not supported')))
+    fygen._set_buffer_size(object())
+    # pylint: enable=protected-access
+
   def test_send(self):
     """Tests the low-level send."""
-    fs = FakeSerial([b'foo\n', b'bar\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'foo\n', b'bar\n'])
     self.assertEqual('foo', fy.send('foocmd'))
     self.assertEqual('bar', fy.send('barcmd'))
     self.assertEqual('foocmd\nbarcmd\n', fs.getvalue())
 
+  def test_send_no_reply(self):
+    """Tests that the response is read but not returned."""
+    fy, fs = make_serial_fygen([b'foo\n', b'bar\n', b'baz\n'])
+    self.assertEqual('', fy.send('foocmd', expect_reply=False))
+    # pylint: disable=protected-access
+    self.assertEqual(
+        ['', ''], fy._send_many(['barcmd', 'bazcmd'], expect_reply=False))
+    # pylint: enable=protected-access
+    self.assertFalse(fs.read_lines)
+
+  def test_send_skips_reset_when_idle(self):
+    """Buffers are only reset when a response was not read completely."""
+    fy, fs = make_serial_fygen([b'foo\n', b'bar\n', b'ba', b'z\n'])
+    self.assertEqual('foo', fy.send('foocmd'))
+    self.assertEqual(1, fs.reset_count)
+    self.assertEqual('bar', fy.send('barcmd'))
+    self.assertEqual(1, fs.reset_count)
+    self.assertEqual('ba', fy.send('bazcmd'))
+    self.assertEqual(1, fs.reset_count)
+    self.assertEqual('z', fy.send('bazcmd'))
+    self.assertEqual(2, fs.reset_count)
+
+  def test_send_many(self):
+    """Tests that several commands go out in a single write."""
+    fy, fs = make_serial_fygen([b'\n', b'\n', b'\n'], init_state=False)
+
+    fy.set(0, volts=3, freq_hz=1000, enable=True)
+    self.assertEqual(
+        ['WMF00001000000000\nWMA3.00\nWMN1\n'], fs.write_lines)
+    self.assertFalse(fs.read_lines)
+
+  def test_send_many_missing_reply(self):
+    """The rest of the batch is sent again in order after a missing reply."""
+    fy, fs = make_serial_fygen(
+        [b'1\n', b'', b'2\n', b'3\n'], init_state=False)
+
+    # pylint: disable=protected-access
+    self.assertEqual(['1', '2', '3'], fy._send_many(['RMA', 'RMF', 'RMN']))
+    # pylint: enable=protected-access
+    self.assertEqual(['RMA\nRMF\nRMN\n', 'RMF\n', 'RMN\n'], fs.write_lines)
+    self.assertEqual(2, fs.reset_count)
+    self.assertFalse(fs.read_lines)
+
+    # A late reply may still be on the way, so the next write resets too.
+    fs.read_lines.append(b'4\n')
+    self.assertEqual('4', fy.send('RMO'))
+    self.assertEqual(3, fs.reset_count)
+
+    fy, fs = make_serial_fygen(
+        [b'', b'\n', b'\n', b'\n'], init_state=False)
+    fy.set(0, volts=3, enable=False)
+    fy.set(0, enable=True)
+    self.assertEqual(
+        ['WMN0\nWMA3.00\n', 'WMN0\n', 'WMA3.00\n', 'WMN1\n'],
+        fs.write_lines)
+    self.assertFalse(fs.read_lines)
+
+  def test_send_many_unbatched(self):
+    """Tests that batch=False sends commands one at a time."""
+    fy, fs = make_serial_fygen(
+        [b'\n', b'\n', b'\n'], init_state=False, batch=False)
+
+    fy.set(0, volts=3, freq_hz=1000, enable=True)
+    self.assertEqual(
+        ['WMF00001000000000\n', 'WMA3.00\n', 'WMN1\n'], fs.write_lines)
+
+  def test_batched(self):
+    """Tests that batched() sends everything in a single write."""
+    fy, fs = make_serial_fygen(
+        [b'\n'] * 4, init_state=False, read_before_write=True)
+
+    with fy.batched():
+      fy.set(0, volts=3, enable=True)
+      with fy.batched():
+        fy.set(1, volts=2)
+      self.assertEqual('', fy.send('UUL0'))
+      self.assertFalse(fs.write_lines)
+    self.assertEqual(
+        ['WMA3.00\nWMN1\nWFA2.00\nUUL0\n'], fs.write_lines)
+    self.assertFalse(fs.read_lines)
+
+  def test_batched_read_error(self):
+    """Tests that reads and exceptions inside batched() send nothing."""
+    fy, fs = make_serial_fygen([])
+
+    with self.assertRaises(fygen.BatchedReadError):
+      with fy.batched():
+        fy.set_uplink(enable=True)
+        fy.get(0, 'volts')
+    self.assertFalse(fs.write_lines)
+
+  def test_batched_error_keeps_init_state(self):
+    """Tests that init_state is sent again if a batch is discarded."""
+    fy, fs = make_serial_fygen([b'\n'] * 7)
+
+    with self.assertRaises(ValueError):
+      with fy.batched():
+        fy.set(0, volts=3)
+        raise ValueError('discard')
+    self.assertFalse(fs.write_lines)
+
+    fy.set(0, volts=3)
+    self.assertEqual(
+        ['WMN0\nWMW00\nWMF00010000000000\nWMA3.00\nWMO0.00\nWMP0.000\n'
+         'WMD50.0\n'],
+        fs.write_lines)
+    self.assertFalse(fs.read_lines)
+
   def test_send_too_short(self):
     """Provides a command that is too short."""
     with self.assertRaises(fygen.CommandTooShortError):
@@ -122,14 +331,22 @@ class TestFYGen(unittest.TestCase):
 
   def test_already_enabled(self):
     """Tests WMN1 is not sent if the channel is already enabled."""
-    fs = FakeSerial([b'1\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'1\n'], init_state=False, read_before_write=True)
 
     fy.set(0, enable=True)
     self.assertEqual('RMN\n', fs.getvalue())
 
+  def test_read_before_write_batched(self):
+    """Tests all parameters are read back with one write before setting."""
+    fy, fs = make_serial_fygen(
+        [b'30000\n', b'0\n', b'\n', b'1\n'],
+        init_state=False, read_before_write=True)
+
+    fy.set(0, volts=3, enable=True)
+    self.assertEqual(['RMA\nRMN\n', 'WMN1\n', 'RMN\n'], fs.write_lines)
+    self.assertFalse(fs.read_lines)
+
   def test_set_disable(self):
     """Tests disable function on both channels."""
     fy = fygen.FYGen(port=self.output, default_channel=(0, 1), init_state=False)
@@ -143,10 +360,8 @@ class TestFYGen(unittest.TestCase):
 
   def test_already_disabled(self):
     """Tests that WMN0 is not sent if the channel is already disabled."""
-    fs = FakeSerial([b'0\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'0\n'], init_state=False, read_before_write=True)
 
     fy.set(0, enable=False)
     self.assertEqual('RMN\n', fs.getvalue())
@@ -170,12 +385,24 @@ class TestFYGen(unittest.TestCase):
     self.fy.set(wave=46)
     self.assertEqual('WMW46\n', self.output.getvalue())
 
+  def test_set_wave_device_mapping(self):
+    """Sets waves whose ids depend on the device and channel."""
+    fy = fygen.FYGen(port=self.output, init_state=False, device_name='fy6900')
+    fy.set(0, wave='dc')
+    fy.set(1, wave='dc')
+    fy.set(0, wave='cmos')
+    fy.set(0, wave='sin')
+    self.assertEqual(
+        'WMW06\n'
+        'WFW05\n'
+        'WMW04\n'
+        'WMW00\n',
+        self.output.getvalue())
+
   def test_wave_already_set(self):
     """Asserts a wave that is already square is not reset to square."""
-    fs = FakeSerial([b'1\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'1\n'], init_state=False, read_before_write=True)
 
     fy.set(0, wave='square')
     self.assertEqual('RMW\n', fs.getvalue())
@@ -210,20 +437,16 @@ class TestFYGen(unittest.TestCase):
 
   def test_freq_already_set1(self):
     """Tests that a frequency is not reset to the same thing."""
-    fs = FakeSerial([b'12345\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'12345\n'], init_state=False, read_before_write=True)
 
     fy.set(0, freq_hz=12345)
     self.assertEqual('RMF\n', fs.getvalue())
 
   def test_freq_already_set2(self):
     """Tests that a frequency is not reset to the same thing."""
-    fs = FakeSerial([b'1234.5\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'1234.5\n'], init_state=False, read_before_write=True)
 
     fy.set(0, freq_uhz=1234500000)
     self.assertEqual('RMF\n', fs.getvalue())
@@ -254,10 +477,8 @@ class TestFYGen(unittest.TestCase):
 
   def test_volts_already_set(self):
     """Tries to set the voltage to an already set value."""
-    fs = FakeSerial([b'56000\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'56000\n'], init_state=False, read_before_write=True)
 
     fy.set(0, volts=5.6)
     self.assertEqual('RMA\n', fs.getvalue())
@@ -285,10 +506,8 @@ class TestFYGen(unittest.TestCase):
 
   def test_duty_cycle_already_set(self):
     """Sets the duty cycle to an already-set value."""
-    fs = FakeSerial([b'10500\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'10500\n'], init_state=False, read_before_write=True)
 
     fy.set(0, duty_cycle=0.105)
     self.assertEqual('RMD\n', fs.getvalue())
@@ -314,10 +533,8 @@ class TestFYGen(unittest.TestCase):
 
   def test_offset_volts_already_set(self):
     """Tries to set the offset voltage to a value already set."""
-    fs = FakeSerial([b'12340\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'12340\n'], init_state=False, read_before_write=True)
 
     fy.set(0, offset_volts=12.34)
     self.assertEqual('RMO\n', fs.getvalue())
@@ -345,10 +562,8 @@ class TestFYGen(unittest.TestCase):
 
   def test_phase_already_set(self):
     """Tries to set the phase to an already-set value."""
-    fs = FakeSerial([b'189300\n'])
-    fy = fygen.FYGen(port=fs, init_state=False)
-    fy.is_serial = True
-    fy.read_before_write = True
+    fy, fs = make_serial_fygen(
+        [b'189300\n'], init_state=False, read_before_write=True)
 
     fy.set(0, phase_degrees=189.3)
     self.assertEqual('RMP\n', fs.getvalue())
@@ -455,9 +670,7 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_enable(self):
     """Gets the current enable status."""
-    fs = FakeSerial([b'255\n', b'0\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'255\n', b'0\n'])
 
     self.assertEqual(True, fy.get(0, 'enable'))
     self.assertEqual(False, fy.get(1, 'enable'))
@@ -465,7 +678,7 @@ class TestFYGen(unittest.TestCase):
 
   def test_get(self):
     """Calls get with no arguments."""
-    fs = FakeSerial([
+    fy, fs = make_serial_fygen([
         b'50000\n',  # duty cycle
         b'255\n',  # enable
         b'12345.6789\n',  # freq hz
@@ -474,8 +687,6 @@ class TestFYGen(unittest.TestCase):
         b'123400\n',  # volts
         b'4\n',  # wave
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
     self.assertEqual({
         'duty_cycle': 0.5,
         'enable': True,
@@ -495,12 +706,12 @@ class TestFYGen(unittest.TestCase):
         'RMW\n'
         '',
         fs.getvalue())
+    # All of the queries go out in a single write.
+    self.assertEqual(1, len(fs.write_lines))
 
   def test_get_wave(self):
     """Gets the current wave."""
-    fs = FakeSerial([b'4\n', b'4\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'4\n', b'4\n'])
     self.assertEqual('dc', fy.get(0, 'wave'))
     self.assertEqual({'wave': 'tri'}, fy.get(1, ('wave',)))
     self.assertEqual('RMW\nRFW\n', fs.getvalue())
@@ -517,35 +728,27 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_invalid_waveform_index(self):
     """Unrecognized wave index is returned by the siggen."""
-    fs = FakeSerial([b'100\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, _ = make_serial_fygen([b'100\n'])
     with self.assertRaises(fygen.UnknownWaveformError):
       fy.get(0, 'wave')
 
   def test_get_freq1(self):
     """Gets the frequency in Hz."""
-    fs = FakeSerial([b'12345.6789\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'12345.6789\n'])
 
     self.assertEqual(12345, fy.get(0, 'freq_hz'))
     self.assertEqual('RMF\n', fs.getvalue())
 
   def test_get_freq2(self):
     """Gets the frequency in uHz."""
-    fs = FakeSerial([b'12345.6789\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'12345.6789\n'])
 
     self.assertEqual(12345678900, fy.get(1, 'freq_uhz'))
     self.assertEqual('RFF\n', fs.getvalue())
 
   def test_get_volts(self):
     """Gets the amplitude voltage."""
-    fs = FakeSerial([b'123400\n', b'5000\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'123400\n', b'5000\n'])
 
     self.assertEqual(12.34, fy.get(0, 'volts'))
     self.assertEqual(0.5, fy.get(1, 'volts'))
@@ -553,9 +756,7 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_offset_volts(self):
     """Gets the offset voltage."""
-    fs = FakeSerial([b'12340\n', b'4294962296\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'12340\n', b'4294962296\n'])
 
     self.assertEqual(12.34, fy.get(0, 'offset_volts'))
     self.assertEqual(-5, fy.get(1, 'offset_volts'))
@@ -563,9 +764,7 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_phase_degrees(self):
     """Gets the phase angle."""
-    fs = FakeSerial([b'0\n', b'189300\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'0\n', b'189300\n'])
 
     self.assertEqual(0, fy.get(0, 'phase_degrees'))
     self.assertEqual(189.3, fy.get(1, 'phase_degrees'))
@@ -573,9 +772,7 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_duty_cycle(self):
     """Gets the duty cycle."""
-    fs = FakeSerial([b'50000\n', b'10500\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'50000\n', b'10500\n'])
 
     self.assertEqual(0.5, fy.get(0, 'duty_cycle'))
     self.assertEqual(0.105, fy.get(1, 'duty_cycle'))
@@ -585,18 +782,85 @@ class TestFYGen(unittest.TestCase):
     """Sets a custom waveform."""
     wave = [-1.0, 0.0, 1.0, 0.0] * 2048
     self.fy.set_waveform(5, values=wave)
-    expected = 'DDS_WAVE5\n'
-    expected += '00000020FF3F002000000020FF3F0020\n' * 1024
-    self.assertEqual(expected, self.output.getvalue())
+    self.assertEqual('DDS_WAVE5\n' + _WAVE_DATA, self.output.getvalue())
 
   def test_set_raw_waveform(self):
     """Sets a custom waveform using raw values."""
     wave = [1, 2, 3, 4] * 2048
     self.fy.set_waveform(6, raw_values=wave)
-    expected = 'DDS_WAVE6\n'
-    expected += '01000200030004000100020003000400\n' * 1024
+    self.assertEqual('DDS_WAVE6\n' + _RAW_WAVE_DATA, self.output.getvalue())
+
+  def test_set_waveform_generator(self):
+    """Sets a custom waveform from generators."""
+    self.fy.set_waveform(5, values=([-1.0, 0.0, 1.0, 0.0][t % 4]
+                                    for t in range(8192)))
+    self.fy.set_waveform(6, raw_values=(t % 4 + 1 for t in range(8192)))
+    expected = ''.join(
+        ('DDS_WAVE5\n', _WAVE_DATA, 'DDS_WAVE6\n', _RAW_WAVE_DATA))
     self.assertEqual(expected, self.output.getvalue())
 
+  def test_pack_raw_values(self):
+    """Packs raw values with and without numpy."""
+    # pylint: disable=protected-access
+    raw_values = [0, 1, 255, 256, 16383]
+    expected = b'\x00\x00\x01\x00\xff\x00\x00\x01\xff\x3f'
+
+    def check():
+      self.assertEqual(expected, fygen._pack_raw_values(raw_values))
+      self.assertEqual(expected, fygen._pack_raw_values(iter(raw_values)))
+      with self.assertRaises(TypeError):
+        fygen._pack_raw_values([0, 1.5])
+      with self.assertRaises(fygen.RawValueRangeError):
+        fygen._pack_raw_values([0, 16384])
+      with self.assertRaises(fygen.RawValueRangeError):
+        fygen._pack_raw_values(iter([-1, 0]))
+
+    check()
+    saved_import_numpy = fygen._import_numpy
+    fygen._import_numpy = lambda: None
+    try:
+      check()
+    finally:
+      fygen._import_numpy = saved_import_numpy
+    # pylint: enable=protected-access
+
+  def test_convert_values_to_raw_values(self):
+    """Converts values with and without numpy."""
+    # pylint: disable=protected-access
+    values = [-2.0, -1.0, -0.5, 0.0, 0.3, 0.99999, 1.0, 2.0]
+    expected = [0, 0, 4096, 8192, 10649, 16383, 16383, 16383]
+    self.assertEqual(
+        expected,
+        list(fygen._convert_values_to_raw_values(values, -1.0, 1.0)))
+    self.assertEqual(
+        expected,
+        list(fygen._convert_values_to_raw_values(iter(values), -1.0, 1.0)))
+    self.assertEqual(
+        expected,
+        list(fygen._convert_values_to_raw_values_slow(values, -1.0, 1.0)))
+    # pylint: enable=protected-access
+
+  def test_convert_values_to_raw_values_bad_input(self):
+    """Out of range and NaN values give the same result without numpy."""
+    # pylint: disable=protected-access
+    def check():
+      self.assertEqual(
+          [16383, 0, 16383],
+          list(fygen._convert_values_to_raw_values(
+              [1e30, -1e30, 2.0], -1.0, 1.0)))
+      with self.assertRaises(ValueError):
+        list(fygen._convert_values_to_raw_values(
+            [1e30, float('nan'), 2.0], -1.0, 1.0))
+
+    check()
+    saved_import_numpy = fygen._import_numpy
+    fygen._import_numpy = lambda: None
+    try:
+      check()
+    finally:
+      fygen._import_numpy = saved_import_numpy
+    # pylint: enable=protected-access
+
   def test_bad_waveform_index(self):
     """Passes an invalid waveform index."""
     with self.assertRaises(fygen.UnknownWaveformError):
@@ -616,17 +880,13 @@ class TestFYGen(unittest.TestCase):
 
   def test_cmd_noack_error(self):
     """Simulates the siggen not responsing to the DDR_WAVE request."""
-    fs = FakeSerial([b'0\n', b'0\n', b'E\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, _ = make_serial_fygen([b'0\n', b'0\n', b'E\n'])
     with self.assertRaises(fygen.CommandNotAcknowledgedError):
       fy.set_waveform(1, values=[0.0]*8192)
 
   def test_data_noack_error(self):
     """Simulates the siggen not responsing to data sent."""
-    fs = FakeSerial([b'0\n', b'0\n', b'W\n', b'E\n'])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, _ = make_serial_fygen([b'0\n', b'0\n', b'W\n', b'E\n'])
     with self.assertRaises(fygen.CommandNotAcknowledgedError):
       fy.set_waveform(1, values=[0.0]*8192)
 
@@ -850,6 +1110,15 @@ class TestFYGen(unittest.TestCase):
     with self.assertRaises(fygen.InvalidGateTimeError):
       self.fy.set_measurement(gate_time=4)
 
+  def test_set_measurement_float_gate_time(self):
+    """Non-integer gate times are truncated."""
+    self.fy.set_measurement(gate_time=0.5)
+    self.fy.set_measurement(gate_time=1.9)
+    self.assertEqual('WCG0\nWCG1\n', self.output.getvalue())
+
+    with self.assertRaises(fygen.InvalidGateTimeError):
+      self.fy.set_measurement(gate_time=2.5)
+
   def test_set_measurement_invalid_coupling(self):
     """Passes an invalid coupling."""
     with self.assertRaises(fygen.InvalidCouplingError):
@@ -857,7 +1126,7 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_measurement(self):
     """Gets all measurements."""
-    fs = FakeSerial([
+    fy, fs = make_serial_fygen([
         b'0\n',  # gate mode = 1S
         b'0000000668\n',  # freq_hz
         b'0000060668\n',  # period_sec
@@ -865,8 +1134,6 @@ class TestFYGen(unittest.TestCase):
         b'0000054321\n',  # negative_width_sec
         b'0000000541\n',  # duty cycle
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
     self.assertEqual(
         {
             'freq_hz': 668.0,
@@ -876,19 +1143,19 @@ class TestFYGen(unittest.TestCase):
             'duty_cycle': 0.541
         },
         fy.get_measurement())
+    self.assertEqual(
+        ['RCG\nRCF\nRCT\nRC+\nRC-\nRCD\n'], fs.write_lines)
 
   def test_get_measurement_counter(self):
     """Gets the counter measurement."""
-    fs = FakeSerial([
+    fy, _ = make_serial_fygen([
         b'0000000669\n',  # counter
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
     self.assertEqual({'counter': 669}, fy.get_measurement({'counter'}))
 
   def test_get_measurement_frequency(self):
     """Gets frequencies."""
-    fs = FakeSerial([
+    fy, _ = make_serial_fygen([
         b'0\n',  # gate mode = 1S
         b'0000000668\n',  # freq_hz
         b'1\n',  # gate mode = 10S
@@ -896,20 +1163,16 @@ class TestFYGen(unittest.TestCase):
         b'2\n',  # gate mode = 100S
         b'0000000668\n',  # freq_hz
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
     self.assertEqual(668.0, fy.get_measurement('freq_hz'))
     self.assertEqual(66.8, fy.get_measurement('freq_hz'))
     self.assertEqual(6.68, fy.get_measurement('freq_hz'))
 
   def test_get_measurement_invalid_gate_time(self):
     """siggen returns an unexpected gate time mode."""
-    fs = FakeSerial([
+    fy, _ = make_serial_fygen([
         b'x\n',  # gate mode = ???
         b'0000000668\n',  # freq_hz
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
     with self.assertRaises(fygen.InvalidGateTimeError):
       fy.get_measurement('freq_hz')
 
@@ -947,15 +1210,13 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_synchronization(self):
     """Gets all known sync modes."""
-    fs = FakeSerial([
+    fy, fs = make_serial_fygen([
         b'0\n',  # duty cycle
         b'255\n',  # freq
         b'0\n',  # offset_volts
         b'255\n',  # volts
         b'0\n',  # wave
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
 
     self.assertEqual({
         'duty_cycle': False,
@@ -975,11 +1236,9 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_synchronization_dict(self):
     """Gets all known sync modes."""
-    fs = FakeSerial([
+    fy, fs = make_serial_fygen([
         b'255\n',  # duty cycle
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
 
     self.assertEqual(
         {'duty_cycle': True},
@@ -988,15 +1247,47 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_synchronization_single(self):
     """Gets all known sync modes."""
-    fs = FakeSerial([
+    fy, fs = make_serial_fygen([
         b'0\n',  # wave
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
 
     self.assertEqual(False, fy.get_synchronization('wave'))
     self.assertEqual('RSA0\n', fs.getvalue())
 
+  def test_get_synchronization_cached(self):
+    """Known sync modes are only reused if cached is set."""
+    fy, fs = make_serial_fygen([
+        b'\n',  # USA0
+        b'255\n',  # duty cycle
+        b'0\n',  # wave
+        b'255\n',  # wave
+    ])
+
+    fy.set_synchronization(wave=True)
+    self.assertEqual(True, fy.get_synchronization('wave', cached=True))
+    self.assertEqual(
+        {'duty_cycle': True, 'wave': True},
+        fy.get_synchronization(('duty_cycle', 'wave'), cached=True))
+    self.assertEqual(True, fy.get_synchronization('duty_cycle', cached=True))
+    self.assertEqual(False, fy.get_synchronization('wave'))
+    self.assertEqual(False, fy.get_synchronization('wave', cached=True))
+    self.assertEqual(True, fy.get_synchronization('wave'))
+    self.assertEqual('USA0\nRSA4\nRSA0\nRSA0\n', fs.getvalue())
+    self.assertFalse(fs.read_lines)
+
+  def test_get_synchronization_after_load(self):
+    """load() forgets cached sync modes, so they are read again."""
+    fy, fs = make_serial_fygen([
+        b'\n',  # USA0
+        b'\n',  # ULN02
+        b'0\n',  # wave
+    ])
+
+    fy.set_synchronization(wave=True)
+    fy.load(2)
+    self.assertEqual(False, fy.get_synchronization('wave', cached=True))
+    self.assertEqual('USA0\nULN02\nRSA0\n', fs.getvalue())
+
   def test_get_invalid_sync_mode(self):
     """Gets an invalid sync mode."""
     with self.assertRaises(fygen.InvalidSynchronizationMode):
@@ -1008,14 +1299,19 @@ class TestFYGen(unittest.TestCase):
     self.fy.set_buzzer(True)
     self.assertEqual('UBZ0\nUBZ1\n', self.output.getvalue())
 
+  def test_set_buzzer_unchanged(self):
+    """The buzzer is not set again when skip_unchanged is set."""
+    self.fy.set_buzzer(True)
+    self.fy.set_buzzer(True, skip_unchanged=True)
+    self.fy.set_buzzer(True)
+    self.assertEqual('UBZ1\nUBZ1\n', self.output.getvalue())
+
   def test_get_buzzer(self):
     """Gets buzzer state."""
-    fs = FakeSerial([
+    fy, fs = make_serial_fygen([
         b'0\n',
         b'255\n',
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
 
     self.assertFalse(fy.get_buzzer())
     self.assertTrue(fy.get_buzzer())
@@ -1036,15 +1332,46 @@ class TestFYGen(unittest.TestCase):
         '',
         self.output.getvalue())
 
+  def test_set_uplink_unchanged(self):
+    """Known uplink settings are not sent again when skip_unchanged is set."""
+    self.fy.set_uplink(is_master=True, enable=True)
+    self.fy.set_uplink(is_master=True, enable=False, skip_unchanged=True)
+    self.fy.set_uplink(is_master=True)
+
+    self.assertEqual(
+        'UMS0\n'
+        'UUL1\n'
+
+        'UUL0\n'
+
+        'UMS0\n'
+        '',
+        self.output.getvalue())
+
+  def test_set_synchronization_unchanged(self):
+    """Known sync modes are not sent again when skip_unchanged is set."""
+    self.fy.set_synchronization(wave=True, freq=False)
+    self.fy.set_synchronization(wave=True, freq=True, skip_unchanged=True)
+    self.fy.set_synchronization(wave=True)
+    self.assertEqual('USA0\nUSD1\nUSA1\nUSA0\n', self.output.getvalue())
+
+  def test_load_forgets_settings(self):
+    """load() clears remembered settings, so writes are not skipped."""
+    self.fy.set_buzzer(True)
+    self.fy.set_synchronization(wave=True)
+    self.fy.load(1)
+    self.fy.set_buzzer(True, skip_unchanged=True)
+    self.fy.set_synchronization(wave=True, skip_unchanged=True)
+    self.assertEqual(
+        'UBZ1\nUSA0\nULN01\nUBZ1\nUSA0\n', self.output.getvalue())
+
   def test_get_uplink(self):
     """Gets uplink settings."""
-    fs = FakeSerial([
+    fy, fs = make_serial_fygen([
         b'0\n',
         b'255\n',
         b'255\n',
     ])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
 
     self.assertEqual({'enable': False, 'is_master': False}, fy.get_uplink())
     self.assertTrue(fy.get_uplink('enable'))
@@ -1053,22 +1380,32 @@ class TestFYGen(unittest.TestCase):
 
   def test_get_id(self):
     """Gets device id."""
-    fs = FakeSerial([b'12345\n',])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'12345\n',])
 
+    self.assertEqual('12345', fy.get_id())
     self.assertEqual('12345', fy.get_id())
     self.assertEqual('UID\n', fs.getvalue())
 
   def test_get_model(self):
     """Gets device model."""
-    fs = FakeSerial([b'fy2300\n',])
-    fy = fygen.FYGen(port=fs)
-    fy.is_serial = True
+    fy, fs = make_serial_fygen([b'fy2300\n',])
 
+    self.assertEqual('fy2300', fy.get_model())
     self.assertEqual('fy2300', fy.get_model())
     self.assertEqual('UMO\n', fs.getvalue())
 
+  def test_invalidate_identity_cache(self):
+    """The id and model are read again after invalidate_identity_cache()."""
+    fy, fs = make_serial_fygen(
+        [b'12345\n', b'fy2300\n', b'12345\n', b'fy2300\n'])
+
+    fy.get_id()
+    fy.get_model()
+    fy.invalidate_identity_cache()
+    fy.get_id()
+    fy.get_model()
+    self.assertEqual('UID\nUMO\nUID\nUMO\n', fs.getvalue())
+
   def test_auto_detect_on_init(self):
     """Autodetects runs on FYGen init"""
     fs = FakeSerial([b'FY6900-60\n',])
@@ -1093,7 +1430,7 @@ class TestFYGen(unittest.TestCase):
 class TestFYGenFY6300(TestFYGen):
   """Test harness for FY6300, which represents frequency differently in WMF/WFF command."""
   def setUp(self):
-    self.output = six.StringIO()
+    self.output = io.StringIO()
     self.fy = fygen.FYGen(
       port=self.output,
       init_state=False,
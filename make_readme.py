@@ -1,6 +1,8 @@
-#!/usr/bin/python2
+#!/usr/bin/env python3
 """Script to turn help files into a README.md"""
 
+import io
+
 import fygen_help
 
 def make_toc_link(section):
@@ -8,19 +10,22 @@ def make_toc_link(section):
 
 def main():
   """Main function."""
-  with open('README.md', 'w') as fout:
-    fout.write('# Table of Contents\n\n')
-    for section in fygen_help.SECTIONS:
-      fout.write('  - [%s](%s)\n' % (section, make_toc_link(section)))
-    fout.write('\n')
+  # Render everything first so a failure does not leave a partial README.md
+  buf = io.StringIO()
+  buf.write('# Table of Contents\n\n')
+  for section in fygen_help.SECTIONS:
+    buf.write('  - [%s](%s)\n' % (section, make_toc_link(section)))
+  buf.write('\n')
 
-    for section_idx in range(len(fygen_help.SECTIONS)):
-      fygen_help.help(
-          section=section_idx,
-          device=None,
-          fout=fout,
-          show_other_sections=False,
-          markdown_format=True)
+  fygen_help.help(
+      section=tuple(range(len(fygen_help.SECTIONS))),
+      device=None,
+      fout=buf,
+      show_other_sections=False,
+      markdown_format=True)
+
+  with open('README.md', 'w') as fout:
+    fout.write(buf.getvalue())
 
 if __name__ == '__main__':
   main()
@@ -1,7 +1,7 @@
 """Waveform mappings for various devices."""
 
+import functools
 import sys
-import six
 
 class Error(Exception):
   """Base error class."""
@@ -26,7 +26,7 @@ class UnsupportedDeviceError(Error):
 
 # If your device is not in SUPPORTED_DEVICES you can pick one and it might
 # mostly work anyway.
-SUPPORTED_DEVICES = set((
+SUPPORTED_DEVICES = frozenset((
     'fy2300',
     'fy6300',
     'fy6600',
@@ -71,6 +71,8 @@ _REPLACE_CODES = {
 # pylint: disable=too-few-public-methods
 class WaveformDef(object):
   """Define a waveform."""
+  __slots__ = ('name', 'description', 'mappings')
+
   def __init__(self, name, mappings):
     """Define a waveform.
 
@@ -110,31 +112,33 @@ class WaveformDef(object):
 
     self.description = ' '.join(new_words)
 
-    # Do some validation of the mappings
-    for map_name, val in six.iteritems(mappings):
-      if map_name.count(':') != 1:
-        raise InvalidMappingError(
-            'mapping does not contain a single ":": %s' % map_name)
-
-      device_name, channel = map_name.split(':')
-
-      if channel not in ('', '0', '1'):
-        raise InvalidMappingError(
-            'mapping does not end with a valid channel: %s' % map_name)
-
-      if device_name and device_name not in SUPPORTED_DEVICES:
-        raise InvalidMappingError(
-            'Device name not in SUPPORTED_DEVICES: %s' % map_name)
-
-      if not isinstance(val, int):
-        raise InvalidMappingError(
-            'mapping value is not an int: %s -> %s' % (map_name, val))
-      if val < 0:
-        raise InvalidMappingError(
-            'mapping value < 0: %s -> %s' % (map_name, val))
-      if val > 99:
-        raise InvalidMappingError(
-            'mapping value > 99: %s -> %s' % (map_name, val))
+    # Do some validation of the mappings.  The mappings are static, so this
+    # is skipped under python -O.
+    if __debug__:
+      for map_name, val in mappings.items():
+        if map_name.count(':') != 1:
+          raise InvalidMappingError(
+              'mapping does not contain a single ":": %s' % map_name)
+
+        device_name, channel = map_name.split(':')
+
+        if channel not in ('', '0', '1'):
+          raise InvalidMappingError(
+              'mapping does not end with a valid channel: %s' % map_name)
+
+        if device_name and device_name not in SUPPORTED_DEVICES:
+          raise InvalidMappingError(
+              'Device name not in SUPPORTED_DEVICES: %s' % map_name)
+
+        if not isinstance(val, int):
+          raise InvalidMappingError(
+              'mapping value is not an int: %s -> %s' % (map_name, val))
+        if val < 0:
+          raise InvalidMappingError(
+              'mapping value < 0: %s -> %s' % (map_name, val))
+        if val > 99:
+          raise InvalidMappingError(
+              'mapping value > 99: %s -> %s' % (map_name, val))
     self.mappings = mappings
 # pylint: enable=too-few-public-methods
 
@@ -178,10 +182,10 @@ _WAVEFORMS = {
 }
 
 def _make_arb(count, start_dict):
-  for arb_index in range(1, count + 1):
-    _WAVEFORMS['arb%u' % arb_index] = start_dict
-    # create a new dictionary will all indexes incremented by one
-    start_dict = dict((k, v+1) for k, v in six.iteritems(start_dict))
+  for arb_index in range(count):
+    # each arb index is offset by one from the last
+    _WAVEFORMS[f'arb{arb_index + 1}'] = {
+        k: v + arb_index for k, v in start_dict.items()}
 
 # Add arb1, arb2 ... arb64
 _make_arb(64, {':0': 34, ':1': 33, 'fy6900:0': 36, 'fy6900:1': 35})
@@ -194,6 +198,12 @@ def _make_waveform_defs():
 
 _WAVEFORM_DEFS = _make_waveform_defs()
 
+# Display order for help(): arbitrary waveforms are listed last.
+_WAVEFORM_DEFS_ARBS_LAST = sorted(
+    _WAVEFORM_DEFS,
+    key=lambda x: x.name.startswith('arb'),
+)
+
 
 def _generate_waveform_id_dict():
   """Maps _WAVEFORM_DEFS -> _WAVEFORM_IDS.
@@ -208,8 +218,8 @@ def _generate_waveform_id_dict():
   data = {}
 
   for waveform in _WAVEFORM_DEFS:
-    for key, wave_id in six.iteritems(waveform.mappings):
-      data['%s:%s' % (waveform.name, key)] = wave_id
+    for key, wave_id in waveform.mappings.items():
+      data[f'{waveform.name}:{key}'] = wave_id
 
   return data
 
@@ -228,18 +238,59 @@ def _generate_waveform_name_dict():
   data = {}
 
   for waveform in _WAVEFORM_DEFS:
-    for key, wave_id in six.iteritems(waveform.mappings):
-      data['%s:%s' % (wave_id, key)] = waveform.name
+    for key, wave_id in waveform.mappings.items():
+      data[f'{wave_id}:{key}'] = waveform.name
 
   return data
 
 _WAVEFORM_NAMES = _generate_waveform_name_dict()
 
-def _generate_waveforms_by_name():
-  """Maps _WAVEFORM_DEFS -> _WAVEFORMS_BY_NAME"""
-  return dict((wf.name, wf) for wf in _WAVEFORM_DEFS)
+def _generate_resolved_dicts():
+  """Maps _WAVEFORM_DEFS -> _RESOLVED_IDS, _RESOLVED_NAMES.
+
+  Applies the mapping fallback rules for every supported device and channel
+  so that get_id() and get_name() need a single lookup:
+    _RESOLVED_IDS: (device, channel, name) -> id
+    _RESOLVED_NAMES: (device, channel, id) -> name
+  """
+  ids = {}
+  names = {}
+
+  for device in SUPPORTED_DEVICES:
+    for channel in (0, 1):
+      # least specific first
+      keys = (':', f':{channel}', f'{device}:', f'{device}:{channel}')
 
-_WAVEFORMS_BY_NAME = _generate_waveforms_by_name()
+      for key in keys:
+        for waveform in _WAVEFORM_DEFS:
+          if key in waveform.mappings:
+            names[(device, channel, waveform.mappings[key])] = waveform.name
+
+      for waveform in _WAVEFORM_DEFS:
+        for key in reversed(keys):
+          if key in waveform.mappings:
+            ids[(device, channel, waveform.name)] = waveform.mappings[key]
+            break
+
+  return ids, names
+
+_RESOLVED_IDS, _RESOLVED_NAMES = _generate_resolved_dicts()
+
+def _generate_valid_lists():
+  """Maps _RESOLVED_IDS -> _VALID_LISTS: (device, channel) -> names."""
+  data = {}
+  for device, channel, name in _RESOLVED_IDS:
+    data.setdefault((device, channel), []).append(name)
+  return dict((k, tuple(sorted(v))) for k, v in data.items())
+
+_VALID_LISTS = _generate_valid_lists()
+
+def _generate_descriptions():
+  """Maps _WAVEFORM_DEFS -> _DESCRIPTIONS"""
+  return dict((wf.name, wf.description) for wf in _WAVEFORM_DEFS)
+
+_DESCRIPTIONS = _generate_descriptions()
+_ALL_NAMES_SORTED = tuple(sorted(_DESCRIPTIONS))
 
 
 def get_id(device_name, name, channel):
@@ -251,18 +302,22 @@ def get_id(device_name, name, channel):
     name: waveform name.  e.g. 'sin'
     channel: channel number
   """
+  wave_id = _RESOLVED_IDS.get((device_name, channel, name))
+  if wave_id is not None:
+    return wave_id
 
   # start with the most specific, work to the most generic
   lookups = (
-      '%s:%s:%d' % (name, device_name, channel),
-      '%s:%s:' % (name, device_name),
-      '%s::%s' % (name, channel),
-      '%s::' % name,
+      f'{name}:{device_name}:{int(channel)}',
+      f'{name}:{device_name}:',
+      f'{name}::{channel}',
+      f'{name}::',
   )
 
   for lookup in lookups:
-    if lookup in _WAVEFORM_IDS:
-      return _WAVEFORM_IDS[lookup]
+    value = _WAVEFORM_IDS.get(lookup)
+    if value is not None:
+      return value
 
   check_is_supported(device_name)
 
@@ -284,18 +339,22 @@ def get_name(device_name, wave_id, channel):
     wave_id: waveform id.  e.g. 0
     channel: channel number
   """
+  name = _RESOLVED_NAMES.get((device_name, channel, wave_id))
+  if name is not None:
+    return name
 
   # start with the most specific, work to the most generic
   lookups = (
-      '%s:%s:%d' % (wave_id, device_name, channel),
-      '%s:%s:' % (wave_id, device_name),
-      '%s::%s' % (wave_id, channel),
-      '%s::' % wave_id,
+      f'{wave_id}:{device_name}:{int(channel)}',
+      f'{wave_id}:{device_name}:',
+      f'{wave_id}::{channel}',
+      f'{wave_id}::',
   )
 
   for lookup in lookups:
-    if lookup in _WAVEFORM_NAMES:
-      return _WAVEFORM_NAMES[lookup]
+    value = _WAVEFORM_NAMES.get(lookup)
+    if value is not None:
+      return value
 
   check_is_supported(device_name)
 
@@ -311,7 +370,7 @@ def check_is_supported(device_name):
   if device_name not in SUPPORTED_DEVICES:
     raise UnsupportedDeviceError(
         'Device %s is not supported.  Supported devices include %s' %
-        (device_name, SUPPORTED_DEVICES))
+        (device_name, ', '.join(sorted(SUPPORTED_DEVICES))))
 
 def get_valid_list(device_name=None, channel=None):
   """Returns a list of all valid waves for a given device_name and channel.
@@ -320,16 +379,20 @@ def get_valid_list(device_name=None, channel=None):
   """
 
   if device_name is None and channel is None:
-    return sorted(_WAVEFORMS_BY_NAME)
+    return list(_ALL_NAMES_SORTED)
+
+  valid_list = _VALID_LISTS.get((device_name, channel))
+  if valid_list is not None:
+    return list(valid_list)
 
   check_is_supported(device_name)
 
   def is_valid(waveform):
     """Returns true if a waveform is valid."""
     lookups = (
-        '%s:%d' % (device_name, channel),
-        ':%d' % channel,
-        '%s:' % device_name,
+        f'{device_name}:{int(channel)}',
+        f':{int(channel)}',
+        f'{device_name}:',
         ':',
     )
     for lookup in lookups:
@@ -341,11 +404,12 @@ def get_valid_list(device_name=None, channel=None):
 
 def get_description(waveform_name):
   """Returns a long description for a waveform name."""
-  if waveform_name not in _WAVEFORMS_BY_NAME:
+  description = _DESCRIPTIONS.get(waveform_name)
+  if description is None:
     raise InvalidWaveformError(
         'No such waveform: %s.  Try get_valid_list()' % waveform_name)
 
-  return _WAVEFORMS_BY_NAME[waveform_name].description
+  return description
 
 # pylint: disable=redefined-builtin
 def help(device_name=None, fout=sys.stdout, use_markdown=False):
@@ -362,63 +426,63 @@ def help(device_name=None, fout=sys.stdout, use_markdown=False):
   if device_name is not None:
     check_is_supported(device_name)
 
-  def dump_row(name, description, channel, device):
-    fout.write('|%-15s|%-30s|%8s|%8s|\n' % (name, description, channel, device))
+  fout.write(_render_help_table(device_name, use_markdown))
+# pylint: enable=redefined-builtin
 
-  def get_compatible(waveform):
-    """
-    Returns compatible devices and channels for a given waveform.
-    At the moment the output would be a bit confusing if two devices
-    support the same waveform but only on different channels.
-    Luckily there aren't any waveforms like that yet
-    """
-    channel_set = set()
-    device_set = set()
-    for mapping in waveform.mappings:
-      is_included = (
-          mapping.startswith(':') or
-          mapping.startswith('%s:' % device_name) or
-          device_name is None
-      )
-      if is_included:
-        device, channel = mapping.split(':')
-        if not device:
-          device_set = SUPPORTED_DEVICES
-        else:
-          device_set.add(device)
-
-        if not channel:
-          channel_set.add('0')
-          channel_set.add('1')
-        else:
-          channel_set.add(channel)
-
-    if not channel_set:
-      return None, None
-
-    if device_set == SUPPORTED_DEVICES:
-      device_text = 'all'
-    else:
-      device_text = ','.join(sorted(device_set))
-
-    channel_text = ', '.join(sorted(channel_set))
-    return (device_text, channel_text)
-
-  def describe_waveform(waveform):
-    """Dumps a waveform description line."""
-    devices, channels = get_compatible(waveform)
-    name = '`%s`' % waveform.name if use_markdown else waveform.name
-    if channels:
-      dump_row(name, waveform.description, channels, devices)
+def _format_row(name, description, channel, device):
+  return '|%-15s|%-30s|%8s|%8s|\n' % (name, description, channel, device)
 
-  dump_row('Name', 'Description', 'Channels', 'Devices')
-  fout.write(
-      '|---------------|------------------------------|--------|--------|\n')
+def _get_compatible(waveform, device_name):
+  """
+  Returns compatible devices and channels for a given waveform.
+  At the moment the output would be a bit confusing if two devices
+  support the same waveform but only on different channels.
+  Luckily there aren't any waveforms like that yet
+  """
+  channel_set = set()
+  device_set = set()
+  for mapping in waveform.mappings:
+    is_included = (
+        mapping.startswith(':') or
+        mapping.startswith(f'{device_name}:') or
+        device_name is None
+    )
+    if is_included:
+      device, channel = mapping.split(':')
+      if not device:
+        device_set = set(SUPPORTED_DEVICES)
+      else:
+        device_set.add(device)
 
-  waveforms_arbs_last = sorted(
-      _WAVEFORM_DEFS,
-      key=lambda x: x.name.startswith('arb'),
-  )
-  for waveform in waveforms_arbs_last:
-    describe_waveform(waveform)
-# pylint: enable=redefined-builtin
+      if not channel:
+        channel_set.add('0')
+        channel_set.add('1')
+      else:
+        channel_set.add(channel)
+
+  if not channel_set:
+    return None, None
+
+  if device_set == SUPPORTED_DEVICES:
+    device_text = 'all'
+  else:
+    device_text = ','.join(sorted(device_set))
+
+  channel_text = ', '.join(sorted(channel_set))
+  return (device_text, channel_text)
+
+@functools.lru_cache(maxsize=None)
+def _render_help_table(device_name, use_markdown):
+  """Returns the help() table.  It only depends on the static waveform data."""
+  rows = [
+      _format_row('Name', 'Description', 'Channels', 'Devices'),
+      '|---------------|------------------------------|--------|--------|\n',
+  ]
+
+  for waveform in _WAVEFORM_DEFS_ARBS_LAST:
+    devices, channels = _get_compatible(waveform, device_name)
+    if channels:
+      name = '`%s`' % waveform.name if use_markdown else waveform.name
+      rows.append(_format_row(name, waveform.description, channels, devices))
+
+  return ''.join(rows)